@@ -4,15 +4,24 @@ from urllib.parse import urljoin, quote
 import re
 
 from bs4 import BeautifulSoup
+from cache import ResponseCache, default_cache, fetch_cached
 from config import CFG
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from metrics import METRICS
+from transport import shared_session, timeout_tuple
 import json
 
 
 class AbilityScraper:
-    def __init__(self, session: Optional[requests.Session] = None):
-        self.session = session or _make_session()
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        parse_only: bool = False,
+    ):
+        # parse_only: just the extract_* methods (parse workers), no session
+        # and no page cache
+        self.session = None if parse_only else (session or shared_session())
+        self.cache = None if parse_only else (cache if cache is not None else default_cache())
 
     def list_ability_original_urls(self, limit: int = 10000) -> List[str]:
         params = {
@@ -23,7 +32,7 @@ class AbilityScraper:
             "filter": "statuscode:200",
             "limit": str(limit),
         }
-        r = self.session.get(CFG["CDX"], params=params, timeout=_timeout_tuple())
+        r = self.session.get(CFG["CDX"], params=params, timeout=timeout_tuple())
         r.raise_for_status()
         rows = r.json()
         if not rows or len(rows) <= 1:
@@ -31,12 +40,20 @@ class AbilityScraper:
         return [row[0] for row in rows[1:] if row]
 
     def build_ability_obj(self, id_url: str) -> dict:
-        timeout = _timeout_tuple(default_read=180)
+        return self.extract_ability_obj(self.fetch_page(id_url), id_url)
+
+    def fetch_page(self, id_url: str) -> bytes:
+        timeout = timeout_tuple(default_read=180)
         headers = {"User-Agent": "Mozilla/5.0 (compatible; AbilityScraper/1.0)"}
-        resp = self.session.get(id_url, headers=headers, timeout=timeout, allow_redirects=True)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.content, "lxml")
+        return fetch_cached(self.session, id_url, self.cache, headers=headers, timeout=timeout, allow_redirects=True)
+
+    def extract_ability_obj(self, content: bytes, id_url: str) -> dict:
+        with METRICS.timer("parse"):
+            soup = BeautifulSoup(content, "lxml")
+        with METRICS.timer("extract"):
+            return self._ability_from_soup(soup, id_url)
 
+    def _ability_from_soup(self, soup: BeautifulSoup, id_url: str) -> dict:
         ts, orig_base = self._extract_snapshot_context(id_url)
 
         ability = {}
@@ -101,35 +118,3 @@ class AbilityScraper:
 __all__ = [
     "AbilityScraper",
 ]
-
-
-# Internal: shared session + timeouts (parallel to pets.py/spells.py)
-def _make_session(total_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=total_retries,
-        connect=total_retries,
-        read=total_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET", "HEAD"),
-        raise_on_status=False,
-    )
-    s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; AbilityScraper/1.0)"})
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    return s
-
-
-def _timeout_tuple(default_read: int = 120) -> Tuple[int, int]:
-    t = CFG.get("TIMEOUT", default_read)
-    connect = 10
-    read = default_read
-    if isinstance(t, (list, tuple)) and len(t) == 2:
-        try:
-            connect, read = int(t[0]), int(t[1])
-        except Exception:
-            connect, read = 10, default_read
-    elif isinstance(t, (int, float)):
-        read = int(t)
-    return (connect, read)
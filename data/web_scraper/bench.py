@@ -0,0 +1,196 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from config import CFG
+
+
+# Offline parser benchmark + golden-output check.
+#
+# bench/corpus/<kind>/*.html is a frozen set of wiki pages covering the layout
+# variants the _get_* extractors handle; bench/corpus/manifest.json maps each
+# file to the id_ URL it stands for (names and icons are derived from it), and
+# bench/golden.json holds the expected extractor output per file.
+#
+#   python bench.py                  # benchmark every extractor, then check golden
+#   python bench.py --check          # golden check only (exit 1 on any diff)
+#   python bench.py --update-golden  # accept current output as the new golden
+#
+# Nothing here touches the network: the page cache is disabled and extractors
+# only ever see the bytes on disk.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, "bench", "corpus")
+MANIFEST = os.path.join(CORPUS, "manifest.json")
+GOLDEN = os.path.join(HERE, "bench", "golden.json")
+
+# extractor name -> corpus folder it runs over
+EXTRACTORS = {
+    "pet": "pets",
+    "pet-soup": "pets",
+    "spell": "spells",
+    "ability": "abilities",
+}
+
+
+def _extractor(name: str):
+    CFG["PAGE_CACHE_DIR"] = None
+    if name in ("pet", "pet-soup"):
+        from pets import PetScraper
+        scraper = PetScraper()
+        return scraper.extract_pet_obj if name == "pet" else scraper._extract_pet_obj_soup
+    if name == "spell":
+        from spells import SpellScraper
+        return SpellScraper().extract_spell_obj
+    if name == "ability":
+        from abilities import AbilityScraper
+        return AbilityScraper().extract_ability_obj
+    raise ValueError(f"unknown extractor: {name}")
+
+
+def load_corpus(folder: str) -> list[tuple[str, str, bytes]]:
+    with open(MANIFEST, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    pages = []
+    for rel in sorted(manifest):
+        if rel.split("/", 1)[0] != folder:
+            continue
+        with open(os.path.join(CORPUS, rel), "rb") as f:
+            pages.append((rel, manifest[rel], f.read()))
+    return pages
+
+
+def _peak_rss_kb() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _percentile(sorted_vals: list[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(pct / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def _run_one(name: str, repeat: int) -> dict:
+    # Runs in a fresh process so peak RSS belongs to this extractor alone.
+    extract = _extractor(name)
+    pages = load_corpus(EXTRACTORS[name])
+    for rel, url, content in pages:
+        extract(content, url)  # warm-up: imports, regex compiles
+    base_rss = _peak_rss_kb()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for rel, url, content in pages:
+            t = time.perf_counter()
+            extract(content, url)
+            latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    peak = _peak_rss_kb()
+    return {
+        "extractor": name,
+        "pages": len(latencies),
+        "pages_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "peak_rss_kb": peak,
+        "rss_growth_kb": (peak - base_rss) if peak is not None and base_rss is not None else None,
+        "corpus_bytes": sum(len(c) for _, _, c in pages),
+    }
+
+
+def benchmark(names: list[str], repeat: int) -> list[dict]:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in names:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(_run_one, (name, repeat)))
+    return results
+
+
+def current_outputs() -> dict:
+    out = {}
+    for name, folder in EXTRACTORS.items():
+        extract = _extractor(name)
+        for rel, url, content in load_corpus(folder):
+            out.setdefault(name, {})[rel] = extract(content, url)
+    return out
+
+
+def check_golden(update: bool = False) -> int:
+    outputs = current_outputs()
+    # the single-pass and soup pet extractors share one golden
+    golden_view = {
+        "pets": outputs["pet"],
+        "spells": outputs["spell"],
+        "abilities": outputs["ability"],
+    }
+    if update:
+        with open(GOLDEN, "w", encoding="utf-8") as f:
+            json.dump(golden_view, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Wrote golden outputs for {sum(len(v) for v in golden_view.values())} pages to {GOLDEN}")
+        return 0
+
+    with open(GOLDEN, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    failures = 0
+    for name, folder in EXTRACTORS.items():
+        expected = golden.get(folder, {})
+        got = outputs[name]
+        for rel in sorted(set(expected) | set(got)):
+            if expected.get(rel) != got.get(rel):
+                failures += 1
+                print(f"GOLDEN MISMATCH [{name}] {rel}")
+                print(f"  expected: {json.dumps(expected.get(rel), ensure_ascii=False)}")
+                print(f"  got:      {json.dumps(got.get(rel), ensure_ascii=False)}")
+    if failures:
+        print(f"{failures} golden mismatches")
+        return 1
+    print(f"Golden outputs match ({sum(len(v) for v in outputs.values())} extractions)")
+    return 0
+
+
+def _print_table(results: list[dict]) -> None:
+    print(f"{'extractor':<10} {'pages':>6} {'pages/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak RSS KB':>12} {'growth KB':>10}")
+    for r in results:
+        print(
+            f"{r['extractor']:<10} {r['pages']:>6} {r['pages_per_sec']:>9} {r['p50_ms']:>8} "
+            f"{r['p99_ms']:>8} {r['peak_rss_kb']!s:>12} {r['rss_growth_kb']!s:>10}"
+        )
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline benchmark and golden check for the page extractors")
+    ap.add_argument("--repeat", type=int, default=20, help="passes over the corpus per extractor")
+    ap.add_argument("--only", action="append", choices=sorted(EXTRACTORS), help="benchmark just these extractors")
+    ap.add_argument("--json", dest="json_out", help="also write benchmark results to this file")
+    ap.add_argument("--check", action="store_true", help="only run the golden-output check")
+    ap.add_argument("--update-golden", action="store_true", help="rewrite bench/golden.json from current output")
+    args = ap.parse_args(argv)
+
+    if args.update_golden:
+        return check_golden(update=True)
+    if not args.check:
+        results = benchmark(args.only or list(EXTRACTORS), args.repeat)
+        _print_table(results)
+        if args.json_out:
+            with open(args.json_out, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    return check_golden()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
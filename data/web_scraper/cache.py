@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from config import CFG
+from metrics import METRICS
+from transport import read_body
+
+
+# Only fixed-timestamp snapshot URLs are safe to cache forever: the bytes behind
+# /web/<ts>id_/... never change once the capture exists.
+_FIXED_SNAPSHOT_RE = re.compile(r"/web/\d{14}(id_|im_)/")
+
+
+def is_cacheable(url: str) -> bool:
+    return bool(url and _FIXED_SNAPSHOT_RE.search(url))
+
+
+# Content-addressed on-disk cache of archived page bodies.
+# Entries live at <root>/<key[:2]>/<key>.z (zlib-compressed body, key = sha256
+# of the snapshot URL), with an optional <key>.meta JSON next to it holding the
+# ETag / Last-Modified validators. An in-memory index of entry sizes (body plus
+# sidecar) in least-recently-used order is built from one walk of the tree at
+# startup; eviction drops the stalest entries from it once the total passes
+# max_bytes. Reads also bump the file mtime, so the next run's walk starts
+# from the same order.
+class ResponseCache:
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, level: int = 6):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.level = level
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # body path -> bytes on disk (body + .meta), oldest first
+        self.index = OrderedDict()
+        for path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+            self.index[path] = self.index.get(path, 0) + size
+        self.total = sum(self.index.values())
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, url: str) -> str:
+        key = self._key(url)
+        return os.path.join(self.root, key[:2], key + ".z")
+
+    def _meta_path(self, path: str) -> str:
+        return path[:-2] + ".meta"
+
+    def _entries(self):
+        # (body path, size, mtime) for every body and sidecar file; a sidecar
+        # is reported under its body's path
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".z"):
+                    path = os.path.join(dirpath, name)
+                elif name.endswith(".meta"):
+                    path = os.path.join(dirpath, name[:-5] + ".z")
+                else:
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _used(self, path: str) -> None:
+        with self.lock:
+            if path in self.index:
+                self.index.move_to_end(path)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def get(self, url: str) -> Optional[bytes]:
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            body = zlib.decompress(blob)
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error):
+            # corrupt or half-written entry: drop it and refetch
+            self._remove(path)
+            return None
+        self._used(path)
+        return body
+
+    def meta(self, url: str) -> dict:
+        try:
+            with open(self._meta_path(self._path(url)), "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except (OSError, ValueError):
+            return {}
+
+    def touch(self, url: str) -> None:
+        self._used(self._path(url))
+
+    def put(self, url: str, body: bytes, meta: Optional[dict] = None) -> None:
+        path = self._path(url)
+        blob = zlib.compress(body, self.level)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if meta:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._meta_path(path))
+        try:
+            meta_size = os.path.getsize(self._meta_path(path))
+        except OSError:
+            meta_size = 0
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        with self.lock:
+            os.replace(tmp, path)
+            size = len(blob) + meta_size
+            self.total += size - self.index.pop(path, 0)
+            self.index[path] = size
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str) -> None:
+        with self.lock:
+            self._delete(path)
+
+    def _delete(self, path: str) -> None:
+        # caller holds self.lock
+        self.total -= self.index.pop(path, 0)
+        for p in (path, self._meta_path(path)):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        # caller holds self.lock; trim to 90% so we don't evict on every put
+        target = int(self.max_bytes * 0.9)
+        while self.total > target and self.index:
+            self._delete(next(iter(self.index)))
+
+
+_DEFAULT: Optional[ResponseCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    # Process-wide cache shared by all scrapers; CFG["PAGE_CACHE_DIR"] = None disables it.
+    global _DEFAULT
+    root = CFG.get("PAGE_CACHE_DIR")
+    if not root:
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = ResponseCache(root, CFG.get("PAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+        return _DEFAULT
+
+
+def fetch_cached(session, url: str, cache: Optional[ResponseCache] = None, **kwargs) -> bytes:
+    # GET `url` through `session`, serving fixed snapshots from `cache` when
+    # possible. Conditional revalidation only concerns non-fixed URLs (no
+    # /web/<ts>id_/ timestamp): one cached with an ETag / Last-Modified is
+    # requested with If-None-Match / If-Modified-Since and reused on 304. The
+    # scrapers fetch fixed id_ snapshots, so their re-crawls are sped up by
+    # the plain cache hits, not by revalidation.
+    with METRICS.timer("fetch"):
+        return _fetch_cached(session, url, cache, **kwargs)
+
+
+def _fetch_cached(session, url: str, cache: Optional[ResponseCache] = None, revalidate: bool = True, **kwargs) -> bytes:
+    if cache is not None and is_cacheable(url):
+        body = cache.get(url)
+        if body is not None:
+            METRICS.incr("page_cache.hit")
+            return body
+        METRICS.incr("page_cache.miss")
+    meta = cache.meta(url) if cache is not None and revalidate else {}
+    headers = dict(kwargs.pop("headers", None) or {})
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with session.get(url, headers=headers, stream=True, **kwargs) as resp:
+        if resp.status_code == 304 and meta:
+            body = cache.get(url)
+            if body is not None:
+                METRICS.incr("page_cache.revalidated")
+                return body
+            # validators outlived the body; fetch it unconditionally and
+            # store it again
+            headers.pop("If-None-Match", None)
+            headers.pop("If-Modified-Since", None)
+            return _fetch_cached(session, url, cache, revalidate=False, headers=headers, **kwargs)
+        resp.raise_for_status()
+        body = read_body(resp)
+        METRICS.incr("fetch.bytes", len(body))
+        validators = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+    validators = {k: v for k, v in validators.items() if v}
+    if cache is not None and (is_cacheable(url) or validators):
+        try:
+            cache.put(url, body, validators or None)
+        except OSError as e:
+            print(f"Page cache write failed: {e}")
+    return body
+
+
+# Persistent original-URL -> id_ URL map for get_archived_id_url.
+# Each entry is {"id_url": str | None, "at": epoch seconds}; a None id_url is a
+# negative result ("no capture") and expires after the shorter neg_ttl so new
+# captures get picked up eventually. The file is rewritten atomically.
+class ResolutionCache:
+    def __init__(self, path: str, ttl: float = 30 * 86400, neg_ttl: float = 86400, flush_every: int = 50):
+        self.path = path
+        self.ttl = ttl
+        self.neg_ttl = neg_ttl
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.entries: dict = {}
+        self.dirty = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f) or {}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Resolution cache unreadable, starting empty: {e}")
+
+    # Returns (found, id_url). found=False means "ask the resolver".
+    def lookup(self, original: str) -> tuple[bool, Optional[str]]:
+        with self.lock:
+            entry = self.entries.get(original)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            id_url = entry.get("id_url")
+            ttl = self.ttl if id_url else self.neg_ttl
+            if time.time() - float(entry.get("at", 0)) > ttl:
+                self.expired += 1
+                self.misses += 1
+                return False, None
+            if id_url:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return True, id_url
+
+    def store(self, original: str, id_url: Optional[str]) -> None:
+        with self.lock:
+            self.entries[original] = {"id_url": id_url, "at": time.time()}
+            self.dirty += 1
+            flush = self.dirty >= self.flush_every
+        if flush:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = dict(self.entries)
+            self.dirty = 0
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Resolution cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+            }
+
+
+_RESOLUTION: Optional[ResolutionCache] = None
+
+
+def default_resolution_cache() -> Optional[ResolutionCache]:
+    # Shared resolver cache; CFG["RESOLVE_CACHE_PATH"] = None disables it.
+    global _RESOLUTION
+    path = CFG.get("RESOLVE_CACHE_PATH")
+    if not path:
+        return None
+    with _DEFAULT_LOCK:
+        if _RESOLUTION is None:
+            _RESOLUTION = ResolutionCache(
+                path,
+                ttl=CFG.get("RESOLVE_TTL", 30 * 86400),
+                neg_ttl=CFG.get("RESOLVE_NEG_TTL", 86400),
+            )
+        return _RESOLUTION
+
+
+__all__ = [
+    "ResolutionCache",
+    "ResponseCache",
+    "default_cache",
+    "default_resolution_cache",
+    "fetch_cached",
+    "is_cacheable",
+]
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+
+# Typed column table of the numeric pet fields, so analytics (scoring.py)
+# work on arrays instead of re-parsing pets.json strings per record.
+#
+#   <output>.columns.npz
+#     id, name        (N,) str
+#     school          (N,) int8, code into school_labels (-1 = none)
+#     school_labels   (S,) str: SCHOOLS first, then any other label sorted
+#     pedigree        (N,) int32
+#     pedigree_null   (N,) bool, pedigree was null (or blank) rather than absent
+#                     or junk: Number() makes it 0 on the site, not "no data"
+#     sell_price      (N,) int32, gold ("5,000 Gold" -> 5000)
+#     attributes      (N, 5) int32, columns in ATTRIBUTES order
+#
+# MISSING (-1) marks an absent or unparseable value ("N/A", "Unknown", null)
+# in every integer column; as_float() turns a column into floats with NaN
+# there. Attributes are read under the exact keys the site's Insights page
+# (SchoolBestPets.tsx) uses; any other label is ignored, and a blank value
+# is 0 as Number("") is there.
+#
+#   python columns.py                     # ../pets.json -> ../pets.columns.npz
+
+MISSING = -1
+ATTRIBUTES = ("Strength", "Intellect", "Agility", "Will", "Power")
+SCHOOLS = ("Balance", "Death", "Fire", "Ice", "Life", "Myth", "Storm")
+
+_INT_MAX = 2**31 - 1
+_INT_RE = re.compile(r"^\d{1,3}(?:,\d{3})*$|^\d+$")
+_GOLD_RE = re.compile(r"^(\d{1,3}(?:,\d{3})*|\d+)\s*(?:gold)?$", re.IGNORECASE)
+
+
+def parse_int(value) -> int:
+    # 250, "250", " 1,000 " -> int; anything else (or past int32) -> MISSING
+    if isinstance(value, bool) or value is None:
+        return MISSING
+    if isinstance(value, float):
+        value = int(value) if value.is_integer() else MISSING
+    elif not isinstance(value, int):
+        s = str(value).strip()
+        value = int(s.replace(",", "")) if _INT_RE.match(s) else MISSING
+    return value if 0 <= value <= _INT_MAX else MISSING
+
+
+def parse_sell_price(value) -> int:
+    # "5,000 Gold" / "50 gold" / 50 -> gold; "Unknown", null -> MISSING
+    if value is None or isinstance(value, (bool, int, float)):
+        return parse_int(value)
+    m = _GOLD_RE.match(" ".join(str(value).split()))
+    return parse_int(m.group(1)) if m else MISSING
+
+
+def as_float(column: np.ndarray) -> np.ndarray:
+    return np.where(column == MISSING, np.nan, column.astype(float))
+
+
+def _is_null(record: dict, key: str) -> bool:
+    # present but null or blank (Number() -> 0), as opposed to absent or junk
+    if key not in record:
+        return False
+    value = record[key]
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class PetTable:
+    def __init__(self, ids, names, school, school_labels, pedigree, pedigree_null, sell_price, attributes):
+        self.ids = ids
+        self.names = names
+        self.school = school
+        self.school_labels = school_labels
+        self.pedigree = pedigree
+        self.pedigree_null = pedigree_null
+        self.sell_price = sell_price
+        self.attributes = attributes
+
+    @classmethod
+    def from_pets(cls, pets: List[dict]) -> "PetTable":
+        n = len(pets)
+        raw_schools = [p.get("school") if isinstance(p.get("school"), str) else None for p in pets]
+        others = sorted({s for s in raw_schools if s is not None} - set(SCHOOLS))
+        labels = list(SCHOOLS) + others
+        code = {s: i for i, s in enumerate(labels)}
+
+        attributes = np.full((n, len(ATTRIBUTES)), MISSING, dtype=np.int32)
+        for i, p in enumerate(pets):
+            attrs = p.get("attributes")
+            if not isinstance(attrs, dict):
+                continue
+            for j, key in enumerate(ATTRIBUTES):
+                value = attrs.get(key)
+                if isinstance(value, str) and not value.strip():
+                    attributes[i, j] = 0
+                elif value is not None:
+                    attributes[i, j] = parse_int(value)
+
+        return cls(
+            ids=np.array([str(p.get("ID") or "") for p in pets], dtype=str),
+            names=np.array([str(p.get("name") or "") for p in pets], dtype=str),
+            school=np.array([code[s] if s is not None else MISSING for s in raw_schools], dtype=np.int8),
+            school_labels=np.array(labels, dtype=str),
+            pedigree=np.array([parse_int(p.get("pedigree")) for p in pets], dtype=np.int32),
+            pedigree_null=np.array([_is_null(p, "pedigree") for p in pets], dtype=bool),
+            sell_price=np.array([parse_sell_price(p.get("sell price")) for p in pets], dtype=np.int32),
+            attributes=attributes,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def schools(self) -> List[str]:
+        # per-pet school label ("" for none)
+        labels = [str(s) for s in self.school_labels]
+        return [labels[c] if c >= 0 else "" for c in self.school.tolist()]
+
+    def attribute(self, name: str) -> np.ndarray:
+        return self.attributes[:, ATTRIBUTES.index(name)]
+
+    def counts(self) -> Dict[str, int]:
+        # non-missing values per column
+        out = {"school": int((self.school != MISSING).sum()),
+               "pedigree": int((self.pedigree != MISSING).sum()),
+               "sell_price": int((self.sell_price != MISSING).sum())}
+        for j, name in enumerate(ATTRIBUTES):
+            out[name] = int((self.attributes[:, j] != MISSING).sum())
+        return out
+
+    def save(self, path: str) -> None:
+        # atomic, like journal.atomic_write_json
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(
+                    f, id=self.ids, name=self.names, school=self.school, school_labels=self.school_labels,
+                    pedigree=self.pedigree, pedigree_null=self.pedigree_null, sell_price=self.sell_price, attributes=self.attributes,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "PetTable":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                ids=z["id"], names=z["name"], school=z["school"], school_labels=z["school_labels"],
+                pedigree=z["pedigree"], pedigree_null=z["pedigree_null"], sell_price=z["sell_price"], attributes=z["attributes"],
+            )
+
+
+def columns_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.columns.npz
+    base, _ = os.path.splitext(output_path)
+    return base + ".columns.npz"
+
+
+def export_columns(pets: List[dict], path: str) -> PetTable:
+    table = PetTable.from_pets(pets)
+    table.save(path)
+    return table
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = os.path.join(here, "..")
+    ap = argparse.ArgumentParser(description="Write the typed column table of pets.json's numeric fields")
+    ap.add_argument("--pets", default=os.path.join(data, "pets.json"))
+    ap.add_argument("-o", "--output", help="default: <pets>.columns.npz")
+    args = ap.parse_args(argv)
+
+    with open(args.pets, "r", encoding="utf-8") as f:
+        pets = json.load(f)
+    out = args.output or columns_path_for(args.pets)
+    table = export_columns(pets, out)
+    print(f"Wrote {len(table)} pets to {out} ({os.path.getsize(out)} B)")
+    for name, n in table.counts().items():
+        print(f"  {name:<10} {n:>5} present, {len(table) - n} missing")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
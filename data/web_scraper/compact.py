@@ -0,0 +1,351 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+from journal import atomic_write_json
+
+
+# Compact, normalized export of pets.json.
+#
+# Every string that repeats across pets (talents, derby abilities, cards,
+# schools, attribute names, sell prices) is stored once in a table; pets refer
+# to entries by integer index. Data is laid out column-wise, one array per
+# field, so the file is mostly small integers:
+#
+#   {
+#     "format": "pets-compact", "version": 1, "count": N,
+#     "tables": {"ability": [...], "spell": [...], "school": [...],
+#                "attribute": [...], "sell_price": [...]},
+#     "columns": {
+#       "id": [str], "name": [str], "description": [str | null],
+#       "school": [int], "sell_price": [int], "pedigree": [int],   (-1 = null)
+#       "icon_ts": [int], "icon_path": [str | null],
+#       "talents" / "derby" / "cards": {"offsets": [N+1 ints], "values": [int]},
+#       "attributes": {"offsets": [N+1 ints], "keys": [int], "values": [int | str]}
+#     },
+#     "icon_raw": {row: icon}
+#   }
+#
+# List fields are ragged arrays: pet i owns values[offsets[i]:offsets[i+1]].
+# IDs are stored as the 22-char unpadded base64url of the UUID's 16 bytes.
+# Icons of the usual
+#   https://web.archive.org/web/<ts>im_/https://<wiki>/wiki/images/<path>
+# shape keep only <ts> and <path>; anything else goes to icon_raw.
+#
+# load_compact() is lazy: it parses the file and hands back a CompactPets
+# sequence that rebuilds a pets.json record only when indexed, or one field
+# for all pets via column(), so a consumer that needs a few fields never pays
+# for the rest. decode_pets() rebuilds every record; validate() checks that
+# an encoding round-trips and is what the export stage runs before writing.
+
+FORMAT = "pets-compact"
+VERSION = 1
+
+_ICON_RE = re.compile(r"^https://web\.archive\.org/web/(\d{14})im_/https://wiki\.wizard101central\.com/wiki/images/(.+)$")
+_ICON_FMT = "https://web.archive.org/web/{ts}im_/https://wiki.wizard101central.com/wiki/images/{path}"
+_NUMERIC_RE = re.compile(r"^(0|[1-9]\d{0,14})$")
+
+# pets.json field order, which decode_pets() reproduces
+_FIELDS = ("ID", "name", "icon", "school", "description", "abilities", "pedigree", "cards", "sell price", "attributes")
+
+
+def _pack_id(pet_id: str) -> str:
+    return base64.urlsafe_b64encode(uuid.UUID(pet_id).bytes).decode("ascii").rstrip("=")
+
+
+def _unpack_id(packed: str) -> str:
+    return str(uuid.UUID(bytes=base64.urlsafe_b64decode(packed + "==")))
+
+
+class _Table:
+    def __init__(self):
+        self.items: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def ref(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.items)
+            self.items.append(value)
+        return i
+
+
+def _ragged() -> dict:
+    return {"offsets": [0], "values": []}
+
+
+def encode_pets(pets: List[dict]) -> dict:
+    tables = {name: _Table() for name in ("ability", "spell", "school", "attribute", "sell_price")}
+    cols = {
+        "id": [],
+        "name": [],
+        "description": [],
+        "school": [],
+        "sell_price": [],
+        "pedigree": [],
+        "icon_ts": [],
+        "icon_path": [],
+        "talents": _ragged(),
+        "derby": _ragged(),
+        "cards": _ragged(),
+        "attributes": {"offsets": [0], "keys": [], "values": []},
+    }
+    icon_raw = {}
+
+    for row, pet in enumerate(pets):
+        extra = set(pet) - set(_FIELDS)
+        if extra:
+            raise ValueError(f"pet {row} ({pet.get('name')!r}) has fields outside the schema: {sorted(extra)}")
+        name = pet.get("name")
+        if not isinstance(name, str):
+            raise ValueError(f"pet {row} has no name: {name!r}")
+        try:
+            packed = _pack_id(pet.get("ID"))
+        except (TypeError, ValueError):
+            raise ValueError(f"pet {row} ({name!r}) has no valid ID: {pet.get('ID')!r}") from None
+        cols["id"].append(packed)
+        cols["name"].append(name)
+        cols["description"].append(pet.get("description"))
+        cols["school"].append(tables["school"].ref(pet.get("school")))
+        cols["sell_price"].append(tables["sell_price"].ref(pet.get("sell price")))
+        pedigree = pet.get("pedigree")
+        if pedigree is not None and (not isinstance(pedigree, int) or isinstance(pedigree, bool) or pedigree < 0):
+            raise ValueError(f"pet {row} ({name!r}) has a non-integer pedigree: {pedigree!r}")
+        cols["pedigree"].append(-1 if pedigree is None else pedigree)
+
+        icon = pet.get("icon")
+        m = _ICON_RE.match(icon) if icon else None
+        if m:
+            cols["icon_ts"].append(int(m.group(1)))
+            cols["icon_path"].append(m.group(2))
+        else:
+            cols["icon_ts"].append(0)
+            cols["icon_path"].append(None)
+            if icon is not None:
+                icon_raw[str(row)] = icon
+
+        abilities = pet.get("abilities") or {}
+        for field, table, values in (
+            ("talents", "ability", abilities.get("talents") or []),
+            ("derby", "ability", abilities.get("derby") or []),
+            ("cards", "spell", pet.get("cards") or []),
+        ):
+            col = cols[field]
+            col["values"].extend(tables[table].ref(v) for v in values)
+            col["offsets"].append(len(col["values"]))
+
+        attrs = cols["attributes"]
+        for key, value in (pet.get("attributes") or {}).items():
+            attrs["keys"].append(tables["attribute"].ref(key))
+            attrs["values"].append(int(value) if isinstance(value, str) and _NUMERIC_RE.match(value) else value)
+        attrs["offsets"].append(len(attrs["keys"]))
+
+    return {
+        "format": FORMAT,
+        "version": VERSION,
+        "count": len(pets),
+        "tables": {name: t.items for name, t in tables.items()},
+        "columns": cols,
+        "icon_raw": icon_raw,
+    }
+
+
+class CompactPets(Sequence):
+    # Lazy view of a decoded compact document. Loading costs one json.loads
+    # of the (small, mostly integer) columnar file; a pet record is rebuilt
+    # only when it is indexed, and whole fields can be read with column()
+    # without building any records.
+    def __init__(self, data: dict):
+        if data.get("format") != FORMAT or data.get("version") != VERSION:
+            raise ValueError(f"not a {FORMAT} v{VERSION} file: {data.get('format')!r} v{data.get('version')!r}")
+        self.tables = data["tables"]
+        self.cols = data["columns"]
+        self.count = data["count"]
+        self.icon_raw = data.get("icon_raw") or {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._record(j) for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self._record(i)
+
+    def _ref(self, table: str, v: int) -> Optional[str]:
+        return self.tables[table][v] if v >= 0 else None
+
+    def _icon(self, i: int) -> Optional[str]:
+        ts = self.cols["icon_ts"][i]
+        return _ICON_FMT.format(ts=ts, path=self.cols["icon_path"][i]) if ts else self.icon_raw.get(str(i))
+
+    def _ragged(self, field: str, table: str, i: int) -> List[str]:
+        col, names = self.cols[field], self.tables[table]
+        return [names[v] for v in col["values"][col["offsets"][i]:col["offsets"][i + 1]]]
+
+    def _attributes(self, i: int) -> dict:
+        attrs, names = self.cols["attributes"], self.tables["attribute"]
+        a0, a1 = attrs["offsets"][i], attrs["offsets"][i + 1]
+        return {names[k]: (str(v) if isinstance(v, int) else v) for k, v in zip(attrs["keys"][a0:a1], attrs["values"][a0:a1])}
+
+    def _record(self, i: int) -> dict:
+        c = self.cols
+        return {
+            "ID": _unpack_id(c["id"][i]),
+            "name": c["name"][i],
+            "icon": self._icon(i),
+            "school": self._ref("school", c["school"][i]),
+            "description": c["description"][i],
+            "abilities": {
+                "talents": self._ragged("talents", "ability", i),
+                "derby": self._ragged("derby", "ability", i),
+            },
+            "pedigree": c["pedigree"][i] if c["pedigree"][i] >= 0 else None,
+            "cards": self._ragged("cards", "spell", i),
+            "sell price": self._ref("sell_price", c["sell_price"][i]),
+            "attributes": self._attributes(i),
+        }
+
+    def column(self, field: str) -> list:
+        # One pets.json field for every pet, in order
+        c = self.cols
+        if field == "name" or field == "description":
+            return list(c[field])
+        if field == "ID":
+            return [_unpack_id(v) for v in c["id"]]
+        if field == "school":
+            return [self._ref("school", v) for v in c["school"]]
+        if field == "sell price":
+            return [self._ref("sell_price", v) for v in c["sell_price"]]
+        if field == "pedigree":
+            return [v if v >= 0 else None for v in c["pedigree"]]
+        if field == "icon":
+            return [self._icon(i) for i in range(self.count)]
+        if field == "cards":
+            return [self._ragged("cards", "spell", i) for i in range(self.count)]
+        if field == "abilities":
+            return [{"talents": self._ragged("talents", "ability", i), "derby": self._ragged("derby", "ability", i)} for i in range(self.count)]
+        if field == "attributes":
+            return [self._attributes(i) for i in range(self.count)]
+        raise KeyError(field)
+
+
+def decode_pets(data: dict) -> List[dict]:
+    return list(CompactPets(data))
+
+
+def _normalized(pet: dict) -> dict:
+    # pets.json as decode_pets() would write it: every schema field present,
+    # abilities always holding both lists
+    abilities = pet.get("abilities") or {}
+    out = {f: pet.get(f) for f in _FIELDS}
+    out["abilities"] = {"talents": list(abilities.get("talents") or []), "derby": list(abilities.get("derby") or [])}
+    out["cards"] = list(pet.get("cards") or [])
+    out["attributes"] = dict(pet.get("attributes") or {})
+    return out
+
+
+def validate(pets: List[dict], data: dict) -> List[str]:
+    # Differences between `pets` and what `data` decodes to (empty = round-trips).
+    problems = []
+    decoded = decode_pets(data)
+    if len(decoded) != len(pets):
+        problems.append(f"count: expected {len(pets)}, decoded {len(decoded)}")
+    for i, (want, got) in enumerate(zip(pets, decoded)):
+        want = _normalized(want)
+        for field in _FIELDS:
+            if want[field] != got[field]:
+                problems.append(f"pet {i} ({want['name']!r}) {field}: expected {want[field]!r}, decoded {got[field]!r}")
+    return problems
+
+
+def load_compact(path: str) -> CompactPets:
+    # Lazy: records are rebuilt on access (list() it for all of pets.json)
+    with open(path, "r", encoding="utf-8") as f:
+        return CompactPets(json.load(f))
+
+
+def export_compact(pets: List[dict], out_path: str) -> dict:
+    # Encode, refuse to write anything that doesn't round-trip, write atomically.
+    data = encode_pets(pets)
+    problems = validate(pets, data)
+    if problems:
+        raise ValueError(f"compact encoding does not round-trip ({len(problems)} problems), first: {problems[0]}")
+    atomic_write_json(out_path, data, indent=None, separators=(",", ":"))
+    return data
+
+
+def compact_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.compact.json
+    base = output_path[:-5] if output_path.endswith(".json") else output_path
+    return base + ".compact.json"
+
+
+def _sizes(text: str) -> tuple[int, int]:
+    raw = text.encode("utf-8")
+    return len(raw), len(gzip.compress(raw, 9))
+
+
+def _time_parse(fn, repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description="Export pets.json to the compact interned format and compare")
+    ap.add_argument("pets", nargs="?", default=os.path.join(here, "..", "pets.json"))
+    ap.add_argument("-o", "--output", help="default: <pets>.compact.json")
+    ap.add_argument("--check", metavar="COMPACT", help="only validate an existing compact file against the pets file")
+    args = ap.parse_args(argv)
+
+    with open(args.pets, "r", encoding="utf-8") as f:
+        source = f.read()
+    pets = json.loads(source)
+
+    if args.check:
+        with open(args.check, "r", encoding="utf-8") as f:
+            problems = validate(pets, json.load(f))
+        for p in problems[:20]:
+            print(p)
+        print(f"{args.check}: {'OK' if not problems else f'{len(problems)} problems'}")
+        return 1 if problems else 0
+
+    out = args.output or compact_path_for(args.pets)
+    data = export_compact(pets, out)
+    with open(out, "r", encoding="utf-8") as f:
+        compact = f.read()
+
+    raw_json, raw_gz = _sizes(source)
+    c_json, c_gz = _sizes(compact)
+    t_raw = _time_parse(lambda: json.loads(source))
+    t_compact = _time_parse(lambda: CompactPets(json.loads(compact)).column("name"))
+    t_decode = _time_parse(lambda: decode_pets(json.loads(compact)))
+    print(f"Wrote {data['count']} pets to {out} (round-trip validated)")
+    print(f"  tables: " + ", ".join(f"{k}={len(v)}" for k, v in data["tables"].items()))
+    print(f"  size:   {raw_json:>9} B -> {c_json:>9} B ({c_json / raw_json:.0%})")
+    print(f"  gzip:   {raw_gz:>9} B -> {c_gz:>9} B ({c_gz / raw_gz:.0%})")
+    print(f"  parse:  {t_raw * 1000:>8.2f} ms -> {t_compact * 1000:>8.2f} ms lazy, names column read")
+    print(f"          {'':>11} {t_decode * 1000:>8.2f} ms to rebuild every record (pets.json-equivalent)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
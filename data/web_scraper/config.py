@@ -1,3 +1,5 @@
+import os
+
 CFG = {
     "CDX": "https://web.archive.org/cdx/search/cdx",
     "WB_WEB": "https://web.archive.org/web",
@@ -7,4 +9,90 @@ CFG = {
     # Timeout can be a number (read timeout seconds) or a (connect, read) tuple.
     # Use a slightly longer connect + read timeout for slow Wayback responses.
     "TIMEOUT": (20, 180),
+    # Concurrent crawl: resolve+fetch+parse jobs in flight at once (1 = serial).
+    "CONCURRENCY": 4,
+    # Adaptive mode: CONCURRENCY is only the starting point. The limit grows
+    # by one per round of responses faster than LATENCY_TARGET seconds and is
+    # multiplied by AIMD_DECREASE on 429/5xx/timeouts; Retry-After pauses all
+    # workers.
+    "ADAPTIVE": True,
+    "MIN_CONCURRENCY": 1,
+    "MAX_CONCURRENCY": 16,
+    "LATENCY_TARGET": 5.0,
+    "AIMD_DECREASE": 0.5,
+    # Shared per-host token bucket replacing the old per-item random sleep:
+    # sustained requests/second per host and the burst allowed on top of it.
+    "RATE_PER_HOST": 2.0,
+    "RATE_BURST": 4,
+    # Keep-alive connections per host in the shared transport (None = enough
+    # for CONCURRENCY workers).
+    "POOL_SIZE_PER_HOST": None,
+    # On-disk cache of fixed-timestamp snapshot pages (zlib, LRU-evicted past
+    # the size cap). Set the dir to None to always hit the network.
+    "PAGE_CACHE_DIR": ".cache/pages",
+    "PAGE_CACHE_MAX_BYTES": 512 * 1024 * 1024,
+    # Persistent original -> id_ URL resolutions. Misses ("no capture") are
+    # cached too, but for a shorter time. TTLs in seconds; None path disables.
+    "RESOLVE_CACHE_PATH": ".cache/resolved.json",
+    "RESOLVE_TTL": 30 * 86400,
+    "RESOLVE_NEG_TTL": 86400,
+    # Per-URL fallback for titles the bulk listing doesn't know: with
+    # RESOLVE_CONCURRENT the availability and CDX lookups for both schemes
+    # run concurrently (at most RESOLVE_INFLIGHT per title, hedges included)
+    # and the highest-priority answer wins; a lookup still running
+    # RESOLVE_HEDGE_AFTER seconds after it started is sent a second time (None
+    # = never). RESOLVE_TIMEOUT replaces TIMEOUT for those lookups (None = same).
+    "RESOLVE_CONCURRENT": False,
+    "RESOLVE_INFLIGHT": 3,
+    "RESOLVE_HEDGE_AFTER": 5.0,
+    "RESOLVE_TIMEOUT": (10, 30),
+    "RESOLVE_WORKERS": 16,
+    # Resolve whole namespaces (Pet:*, Spell:*, ...) with paged CDX listings
+    # and pick snapshots locally; titles missing from the listing still fall
+    # back to the per-URL resolver.
+    "BULK_RESOLVE": True,
+    "CDX_PAGE_SIZE": 5000,
+    # Parse stage: worker processes running the extractors (None = one per
+    # CPU, 0 = parse inline in the crawl threads). PIPELINE_DEPTH caps how many
+    # items may sit between fetch, parse and write at once.
+    "PARSE_PROCESSES": None,
+    "PIPELINE_DEPTH": 64,
+    # Telemetry: live progress/ETA line at most every PROGRESS_INTERVAL
+    # seconds, and a <output>.report.json with per-stage timings and counters
+    # at the end of each scrape.
+    "PROGRESS_INTERVAL": 2.0,
+    "RUN_REPORT": True,
+    # After scraping pets, also write <output>.compact.json: interned string
+    # tables + column arrays, validated to round-trip (see compact.py).
+    "EXPORT_COMPACT": True,
+    # Also write <output>.columns.npz: typed numeric columns (canonical
+    # attributes, pedigree, sell price in gold, school codes) for scoring.py
+    # and other array analytics (see columns.py).
+    "EXPORT_COLUMNS": True,
+    # Also write <output dir>/pets/manifest.json (ID, name, school, pedigree,
+    # shard) plus content-hashed detail shards bucketed by the first
+    # SHARD_PREFIX_LEN hex digits of each pet's ID (see shards.py).
+    "EXPORT_SHARDS": False,
+    "SHARD_PREFIX_LEN": 2,
+    # After each scrape, rebuild <output dir>/search_index.json: prefix and
+    # trigram postings over pet, spell and ability names (see search_index.py).
+    "SEARCH_INDEX": True,
+    # After each scrape, also rewrite <output dir>/pets.joined.json: pets
+    # whose talents, derby and cards are IDs into ability / spell tables
+    # (rarity, icon), see joined.py. Off by default; `python joined.py`
+    # builds it on demand.
+    "EXPORT_JOINED": False,
+    # Cooperative crawls (workqueue.py): keys claimed per lease, seconds a
+    # lease lasts without a heartbeat, and errors before an item is given up.
+    "QUEUE_BATCH": 8,
+    "QUEUE_LEASE": 120.0,
+    "QUEUE_MAX_ATTEMPTS": 3,
 }
+
+# Point every Wayback endpoint at another host, e.g. the local stand-in from
+# fake_wayback.py: WAYBACK_BASE=http://127.0.0.1:8099 python main.py
+if os.environ.get("WAYBACK_BASE"):
+    _base = os.environ["WAYBACK_BASE"].rstrip("/")
+    CFG["CDX"] = f"{_base}/cdx/search/cdx"
+    CFG["WB_WEB"] = f"{_base}/web"
+    CFG["WB_AVAIL"] = f"{_base}/wayback/available"
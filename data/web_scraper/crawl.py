@@ -0,0 +1,307 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+# Classic token bucket: `rate` tokens per second, holding at most `burst`.
+# acquire() blocks until a token is available, so callers never need to sleep
+# blindly between requests.
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# One bucket per host, created lazily, shared by every worker thread.
+class HostRateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            b = self.buckets.get(host)
+            if b is None:
+                b = self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return b
+
+    def acquire(self, url: str) -> None:
+        self.bucket(url).acquire()
+
+
+# requests.Session that takes a token from the host's bucket before each call
+# and, when given an observer (e.g. AIMDController.record), reports the final
+# status and latency of every call.
+class RateLimitedSession(requests.Session):
+    def __init__(self, limiter: Optional[HostRateLimiter] = None, observer=None):
+        super().__init__()
+        self.limiter = limiter
+        self.observer = observer
+
+    def request(self, method, url, *args, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire(url)
+        start = time.monotonic()
+        try:
+            resp = super().request(method, url, *args, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            if self.observer is not None:
+                self.observer(None, time.monotonic() - start)
+            raise
+        if self.observer is not None:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After")) if resp.status_code in (429, 503) else None
+            self.observer(resp.status_code, time.monotonic() - start, retry_after)
+        return resp
+
+
+# Additive-increase / multiplicative-decrease limit on in-flight jobs.
+# Every HTTP response (including urllib3's internal retries) is reported via
+# record(): a full round of fast successes raises the limit by `increase`;
+# a 429/5xx or timeout cuts it by `decrease` (at most once per smoothed
+# round-trip, so one burst of errors counts once). Retry-After pauses every
+# worker, not just the one that got the response.
+class AIMDController:
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 16,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_target: float = 5.0,
+    ):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cwnd = float(min(self.maximum, max(self.minimum, initial)))
+        self.in_flight = 0
+        self.round_ok = 0
+        self.srtt: Optional[float] = None
+        self.last_cut = 0.0
+        self.paused_until = 0.0
+        self.counts = {"ok": 0, "slow": 0, "throttled": 0, "server_error": 0, "timeout": 0}
+        self.cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self.cwnd)
+
+    def configure(self, initial: int, maximum: Optional[int] = None) -> None:
+        # Restart from `initial` calls in flight, optionally with a new ceiling
+        # (e.g. a caller's explicit concurrency)
+        with self.cond:
+            if maximum is not None:
+                self.maximum = max(self.minimum, int(maximum))
+            self.cwnd = float(min(self.maximum, max(self.minimum, initial)))
+            self.round_ok = 0
+            self.cond.notify_all()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                self.cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def record(self, status: Optional[int], latency: float, retry_after: Optional[float] = None) -> None:
+        # status=None means the request failed without a response (timeout,
+        # connection reset).
+        with self.cond:
+            old = self.limit
+            now = time.monotonic()
+            if status is None or status == 429 or status >= 500:
+                kind = "timeout" if status is None else ("throttled" if status == 429 else "server_error")
+                self.counts[kind] += 1
+                self.round_ok = 0
+                if now - self.last_cut >= (self.srtt or 1.0):
+                    self.cwnd = max(float(self.minimum), self.cwnd * self.decrease)
+                    self.last_cut = now
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            else:
+                self.srtt = latency if self.srtt is None else 0.875 * self.srtt + 0.125 * latency
+                if latency > self.latency_target:
+                    self.counts["slow"] += 1
+                    self.round_ok = 0
+                else:
+                    self.counts["ok"] += 1
+                    self.round_ok += 1
+                    if self.round_ok >= self.limit:
+                        self.round_ok = 0
+                        self.cwnd = min(float(self.maximum), self.cwnd + self.increase)
+            new = self.limit
+            self.cond.notify_all()
+        if new != old:
+            reason = "errors" if new < old else "healthy"
+            print(f"Concurrency {old} -> {new} ({reason}, srtt={self.srtt or 0:.2f}s)")
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "concurrency": self.limit,
+                "in_flight": self.in_flight,
+                "srtt": round(self.srtt, 3) if self.srtt is not None else None,
+                **self.counts,
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+# Work queue for names discovered while another stage is still running: each
+# item is accepted once, and iterating blocks for more until close() has been
+# called and everything queued has been handed out. Hand the queue to crawl()
+# or pipeline() as their `items`.
+class DedupQueue:
+    def __init__(self):
+        self.seen: set = set()
+        self.order: list = []
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def put(self, item) -> bool:
+        with self.cond:
+            if item in self.seen:
+                return False
+            self.seen.add(item)
+            self.order.append(item)
+            self.cond.notify_all()
+            return True
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self) -> int:
+        with self.cond:
+            return len(self.order)
+
+    def __iter__(self) -> Iterator:
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.order) and not self.closed:
+                    self.cond.wait()
+                if i >= len(self.order):
+                    return
+                item = self.order[i]
+            i += 1
+            yield item
+
+
+def crawl(
+    items: Iterable[T],
+    job: Callable[[T], R],
+    concurrency: int = 1,
+    controller: Optional[AIMDController] = None,
+) -> Iterator[Tuple[T, Optional[R], Optional[Exception]]]:
+    # Run `job` over `items` with up to `concurrency` calls in flight and yield
+    # (item, result, error) in input order, so callers can keep the exact
+    # append/checkpoint logic of a serial loop. With a controller, the number
+    # of calls in flight follows controller.limit, capped at `concurrency`.
+    concurrency = max(1, int(concurrency or 1))
+    if controller is not None:
+        concurrency = min(concurrency, controller.maximum)
+        inner = job
+
+        def job(item):
+            controller.acquire()
+            try:
+                return inner(item)
+            finally:
+                controller.release()
+
+    if concurrency == 1:
+        for item in items:
+            try:
+                yield item, job(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    # Keep a bounded window of submitted work so a slow head-of-line item
+    # does not let the queue grow without limit.
+    window = concurrency * 2
+    pending: deque = deque()
+    it = iter(items)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append((item, pool.submit(job, item)))
+            if not pending:
+                return
+            item, fut = pending.popleft()
+            try:
+                yield item, fut.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+__all__ = [
+    "AIMDController",
+    "DedupQueue",
+    "TokenBucket",
+    "HostRateLimiter",
+    "RateLimitedSession",
+    "crawl",
+    "parse_retry_after",
+]
@@ -0,0 +1,358 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from config import CFG
+from snapshots import url_key
+
+
+# Local stand-in for the Wayback Machine, for load-testing the crawler offline.
+#
+# Speaks the three protocols the scrapers use:
+#   GET /cdx/search/cdx?url=...        CDX JSON (fl, filter, collapse, sort=reverse,
+#                                      limit, showResumeKey/resumeKey)
+#   GET /wayback/available?url=...     availability API
+#   GET /web/<ts>id_/<original>        raw snapshot bytes (im_ serves a 1x1 PNG)
+#   GET /__stats                       request counters, for measuring a run
+#
+# Pages come from a fixture directory laid out like bench/corpus: a
+# manifest.json mapping "<folder>/<file>.html" to the id_ URL it captures.
+# Each capture can be replicated N times under new titles so a crawl can be run
+# at many times the real dataset size, and latency, 429/503 responses and hung
+# requests can be injected at configurable rates.
+#
+#   python fake_wayback.py --port 8099 --replicas 100 --p429 0.02
+#   WAYBACK_BASE=http://127.0.0.1:8099 python main.py
+#
+#   python fake_wayback.py --run pets --replicas 100 --latency 0.05
+#     (serves, crawls pets against it with throwaway caches, prints a summary)
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench", "corpus")
+
+_PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+_ID_URL_RE = re.compile(r"/web/(\d{4,14})(?:[a-z]{2}_)?/(.+)$")
+_TITLE_RE = re.compile(rb"(<title>)(.*?)( - Wizard101 Wiki)?(</title>)", re.S | re.I)
+
+
+class Capture:
+    __slots__ = ("original", "timestamp", "statuscode", "digest", "body")
+
+    def __init__(self, original: str, timestamp: str, statuscode: str, digest: str, body: bytes):
+        self.original = original
+        self.timestamp = timestamp
+        self.statuscode = statuscode
+        self.digest = digest
+        self.body = body
+
+    def field(self, name: str) -> str:
+        if name == "urlkey":
+            return url_key(self.original)
+        if name == "mimetype":
+            return "text/html"
+        if name == "length":
+            return str(len(self.body))
+        return getattr(self, name)
+
+
+def _replica_body(body: bytes, n: int) -> bytes:
+    # give replica n its own page title so names/IDs differ from the original
+    def sub(m):
+        return m.group(1) + m.group(2) + f" r{n}".encode() + (m.group(3) or b"") + m.group(4)
+    return _TITLE_RE.sub(sub, body, count=1)
+
+
+def _replica_url(original: str, n: int) -> str:
+    return original if n == 0 else f"{original}_r{n}"
+
+
+def load_fixtures(root: str, replicas: int = 1) -> List[Capture]:
+    with open(os.path.join(root, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    captures = []
+    for rel, id_url in sorted(manifest.items()):
+        m = _ID_URL_RE.search(id_url)
+        if not m:
+            continue
+        ts, original = m.group(1).ljust(14, "0"), m.group(2)
+        with open(os.path.join(root, rel), "rb") as f:
+            body = f.read()
+        for n in range(max(1, replicas)):
+            b = body if n == 0 else _replica_body(body, n)
+            url = _replica_url(original, n)
+            # digest per (url, body) so collapse=digest never merges replicas
+            digest = hashlib.sha1(url.encode() + b).hexdigest().upper()[:32]
+            captures.append(Capture(url, ts, "200", digest, b))
+    captures.sort(key=lambda c: (url_key(c.original), c.timestamp))
+    return captures
+
+
+class FaultPlan:
+    def __init__(self, latency=0.0, jitter=0.0, p429=0.0, p503=0.0, ptimeout=0.0, hang=30.0, retry_after=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.p503 = p503
+        self.ptimeout = ptimeout
+        self.hang = hang
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self) -> tuple[float, Optional[int]]:
+        # (delay seconds, injected status or None); status 0 means "hang"
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            r = self.rng.random()
+        if r < self.ptimeout:
+            return self.hang, 0
+        if r < self.ptimeout + self.p429:
+            return delay, 429
+        if r < self.ptimeout + self.p429 + self.p503:
+            return delay, 503
+        return delay, None
+
+
+class FakeWayback:
+    def __init__(self, captures: List[Capture], faults: Optional[FaultPlan] = None):
+        self.captures = captures
+        self.faults = faults or FaultPlan()
+        self.by_key: Dict[str, List[Capture]] = {}
+        for c in captures:
+            self.by_key.setdefault(url_key(c.original), []).append(c)
+        self.stats: Counter = Counter()
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    # --- protocol handlers: return (status, content-type, body) ---
+
+    def cdx(self, q: dict) -> tuple[int, str, bytes]:
+        target = q.get("url", [""])[0]
+        prefix = target.endswith("*")
+        key = url_key(target.rstrip("*"))
+        rows = [c for c in self.captures if (url_key(c.original).startswith(key) if prefix else url_key(c.original) == key)]
+
+        for flt in q.get("filter", []):
+            neg = flt.startswith("!")
+            field, _, pattern = flt.lstrip("!").partition(":")
+            rx = re.compile(pattern)
+            rows = [c for c in rows if bool(rx.fullmatch(c.field(field))) != neg]
+        for col in q.get("collapse", []):
+            out, last = [], None
+            for c in rows:
+                v = c.field(col)
+                if v != last:
+                    out.append(c)
+                last = v
+            rows = out
+        if q.get("sort", [""])[0] == "reverse":
+            rows = rows[::-1]
+
+        start = int(q.get("resumeKey", ["0"])[0] or 0)
+        limit = int(q.get("limit", ["0"])[0] or 0)
+        end = start + limit if limit > 0 else len(rows)
+        page = rows[start:end]
+        fields = (q.get("fl", [""])[0] or "urlkey,timestamp,original,mimetype,statuscode,digest,length").split(",")
+        data = [fields] + [[c.field(f) for f in fields] for c in page]
+        if q.get("showResumeKey", [""])[0] == "true" and end < len(rows):
+            data += [[], [str(end)]]
+        return 200, "application/json", json.dumps(data).encode()
+
+    def available(self, q: dict, base: str) -> tuple[int, str, bytes]:
+        caps = [c for c in self.by_key.get(url_key(q.get("url", [""])[0]), []) if c.statuscode == "200"]
+        snap = {}
+        if caps:
+            c = caps[-1]
+            snap = {"closest": {
+                "status": c.statuscode,
+                "available": True,
+                "url": f"{base}/web/{c.timestamp}/{c.original}",
+                "timestamp": c.timestamp,
+            }}
+        body = {"url": q.get("url", [""])[0], "archived_snapshots": snap}
+        return 200, "application/json", json.dumps(body).encode()
+
+    def snapshot(self, path: str) -> tuple[int, str, bytes]:
+        m = _ID_URL_RE.search(path)
+        if not m:
+            return 404, "text/plain", b"not found"
+        if "im_/" in path:
+            return 200, "image/png", _PNG_1X1
+        ts, original = m.group(1), m.group(2)
+        caps = self.by_key.get(url_key(original), [])
+        if not caps:
+            return 404, "text/html", b"<html><body>Not in archive</body></html>"
+        # closest capture by timestamp, like the real archive's redirect
+        c = min(caps, key=lambda c: abs(int(c.timestamp) - int(ts.ljust(14, "0"))))
+        return 200, "text/html; charset=UTF-8", c.body
+
+    # --- server plumbing ---
+
+    def count(self, endpoint: str, status: int, nbytes: int) -> None:
+        with self.lock:
+            self.stats[f"{endpoint} {status}"] += 1
+            self.bytes_out += nbytes
+
+    def snapshot_stats(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.stats), "bytes_out": self.bytes_out}
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                q = parse_qs(parts.query, keep_blank_values=True)
+                base = f"http://{self.headers.get('Host') or f'{host}:{fake.port}'}"
+                if parts.path == "/__stats":
+                    return self.reply("stats", 200, "application/json", json.dumps(fake.snapshot_stats()).encode())
+                if parts.path == "/cdx/search/cdx":
+                    endpoint = "cdx"
+                elif parts.path == "/wayback/available":
+                    endpoint = "available"
+                elif parts.path.startswith("/web/"):
+                    endpoint = "web"
+                else:
+                    return self.reply("other", 404, "text/plain", b"not found")
+
+                delay, injected = fake.faults.draw()
+                if delay:
+                    time.sleep(delay)
+                if injected == 0:
+                    # hung request: client read timeout fires first
+                    fake.count(endpoint, 0, 0)
+                    self.close_connection = True
+                    return
+                if injected:
+                    extra = {"Retry-After": str(fake.faults.retry_after)} if fake.faults.retry_after is not None else {}
+                    return self.reply(endpoint, injected, "text/plain", b"slow down", extra)
+
+                if endpoint == "cdx":
+                    status, ctype, body = fake.cdx(q)
+                elif endpoint == "available":
+                    status, ctype, body = fake.available(q, base)
+                else:
+                    status, ctype, body = fake.snapshot(parts.path + (f"?{parts.query}" if parts.query else ""))
+                self.reply(endpoint, status, ctype, body)
+
+            def reply(self, endpoint, status, ctype, body, headers=None):
+                fake.count(endpoint, status, len(body))
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.port}"
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def point_config_at(base: str) -> None:
+    # Same effect as running with WAYBACK_BASE=<base>
+    CFG["CDX"] = f"{base}/cdx/search/cdx"
+    CFG["WB_AVAIL"] = f"{base}/wayback/available"
+    CFG["WB_WEB"] = f"{base}/web"
+
+
+def run_crawl(kind: str, base: str, fake: FakeWayback, rate: Optional[float] = None) -> dict:
+    # Crawl against the stand-in with throwaway caches so every run measures
+    # real request traffic, then report throughput and server-side counters.
+    work = tempfile.mkdtemp(prefix="fake_wayback_")
+    point_config_at(base)
+    CFG["PAGE_CACHE_DIR"] = None
+    CFG["RESOLVE_CACHE_PATH"] = None
+    if rate is not None:
+        # must be set before transport builds its limiter on first import
+        CFG["RATE_PER_HOST"] = rate
+    import main
+
+    out = os.path.join(work, f"{kind}.json")
+    start = time.perf_counter()
+    if kind == "pets":
+        main.scrape_pets(out)
+    else:
+        raise ValueError(f"unknown crawl kind: {kind}")
+    elapsed = time.perf_counter() - start
+    with open(out, "r", encoding="utf-8") as f:
+        records = len(json.load(f))
+    return {
+        "kind": kind,
+        "records": records,
+        "seconds": round(elapsed, 2),
+        "records_per_sec": round(records / elapsed, 2) if elapsed else None,
+        "server": fake.snapshot_stats(),
+        "output": out,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Local Wayback Machine stand-in for offline crawl load tests")
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="directory with manifest.json + pages")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--replicas", type=int, default=1, help="copies of each fixture capture, under new titles")
+    ap.add_argument("--latency", type=float, default=0.0, help="added seconds per request")
+    ap.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform latency noise")
+    ap.add_argument("--p429", type=float, default=0.0, help="fraction of requests answered 429")
+    ap.add_argument("--p503", type=float, default=0.0, help="fraction of requests answered 503")
+    ap.add_argument("--ptimeout", type=float, default=0.0, help="fraction of requests that hang")
+    ap.add_argument("--hang", type=float, default=30.0, help="seconds a hung request stalls before dropping")
+    ap.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds on 429/503")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--rate", type=float, default=None, help="with --run: override RATE_PER_HOST (0 = unlimited)")
+    ap.add_argument("--run", choices=["pets"], help="crawl against the server, print a JSON summary, and exit")
+    args = ap.parse_args(argv)
+
+    faults = FaultPlan(args.latency, args.jitter, args.p429, args.p503, args.ptimeout, args.hang, args.retry_after, args.seed)
+    fake = FakeWayback(load_fixtures(args.fixtures, args.replicas), faults)
+    base = fake.start(args.host, 0 if args.run else args.port)
+    print(f"Fake Wayback serving {len(fake.captures)} captures at {base}", file=sys.stderr)
+
+    if args.run:
+        try:
+            print(json.dumps(run_crawl(args.run, base, fake, args.rate), indent=2))
+        finally:
+            fake.stop()
+        return 0
+
+    print(f"Point the crawler at it with WAYBACK_BASE={base}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from typing import Iterator, Optional
+
+from lxml import html as lxml_html
+
+
+# lxml helpers that reproduce the BeautifulSoup calls the scrapers were written
+# against (get_text, .string, class_ matching), so extractors can walk the raw
+# lxml tree without building a soup first.
+
+# bs4 gives strings under these tags their own types and leaves them out of
+# get_text(); comments are skipped as well.
+_SKIP_TEXT_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+
+
+def parse_html(content: bytes):
+    # Same decoding preference as bs4 for wiki pages: UTF-8, else windows-1252.
+    try:
+        content.decode("utf-8")
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = "windows-1252"
+    parser = lxml_html.HTMLParser(encoding=encoding)
+    return lxml_html.document_fromstring(content, parser=parser)
+
+
+def is_element(el) -> bool:
+    return isinstance(el.tag, str)
+
+
+def iter_strings(el) -> Iterator[str]:
+    if el.tag in _SKIP_TEXT_TAGS:
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        if is_element(child):
+            yield from iter_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def text(el, sep: str = "") -> str:
+    # Tag.get_text(sep, strip=True)
+    return sep.join(s for s in (t.strip() for t in iter_strings(el)) if s)
+
+
+def only_string(el) -> Optional[str]:
+    # Tag.string: the text of the single child node, recursing through
+    # single-child tags; None when there is more than one child.
+    while True:
+        count = 0
+        only = None
+        if el.text:
+            count, only = 1, el.text
+        for child in el:
+            count += 1
+            only = child
+            if child.tail:
+                count += 1
+                only = child.tail
+            if count > 1:
+                return None
+        if count != 1:
+            return None
+        if isinstance(only, str):
+            return only
+        if not is_element(only):
+            # comment / processing instruction
+            return only.text
+        el = only
+
+
+def has_class(el, *names: str) -> bool:
+    classes = (el.get("class") or "").split()
+    return all(n in classes for n in names)
+
+
+def first_ancestor(el, tag: str):
+    return next(el.iterancestors(tag), None)
+
+
+def next_sibling(el, tag: str):
+    return next(el.itersiblings(tag), None)
+
+
+def first_descendant(el, tag: str, **attrs):
+    # Tag.find(tag, attr=True): first descendant having every listed attribute
+    for d in el.iterdescendants(tag):
+        if all(d.get(a) is not None for a in attrs):
+            return d
+    return None
+
+
+__all__ = [
+    "first_ancestor",
+    "first_descendant",
+    "has_class",
+    "is_element",
+    "iter_strings",
+    "next_sibling",
+    "only_string",
+    "parse_html",
+    "text",
+]
@@ -0,0 +1,118 @@
+import json
+import os
+from typing import Container, Dict, List, Optional, Tuple
+
+from journal import atomic_write_json
+from jsonstream import iter_json_array
+from snapshots import BulkResolver
+
+
+# Sidecar for incremental refreshes: which capture every record was built from.
+#
+#   <output>.meta.json   {"version": 1, "count": N,
+#                         "pages": {source URL: {"ts": ..., "digest": ..., "row": i | null,
+#                                                "empty": true (only with row null)}}}
+#
+# "row" is the record's index in <output>, and "count" the number of records
+# <output> held when the sidecar was written; if the two files no longer agree
+# the sidecar is ignored and the next run is a full one. "empty" marks a URL
+# that was journaled as producing no record (no capture). URLs that failed
+# get no entry at all, so the next refresh treats them as new.
+#
+# A refresh compares every URL against the bulk CDX listing: a URL whose best
+# capture still has the digest we built the record from keeps its record, and
+# only new URLs, changed digests and rows without a record (unless "empty")
+# are fetched again.
+
+VERSION = 1
+
+
+def meta_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.meta.json
+    base, _ = os.path.splitext(output_path)
+    return base + ".meta.json"
+
+
+def load_previous(output_path: str) -> Tuple[Dict[str, dict], Dict[str, Optional[dict]]]:
+    # (pages, records by URL) from the last run, or two empty dicts if there
+    # is no usable sidecar.
+    try:
+        with open(meta_path_for(output_path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        pages = meta.get("pages") or {}
+        url_at = {page["row"]: url for url, page in pages.items() if page.get("row") is not None}
+        by_url = {url: None for url in pages}
+        count = 0
+        for row, record in enumerate(iter_json_array(output_path)):
+            if row in url_at:
+                by_url[url_at[row]] = record
+            count += 1
+    except (OSError, ValueError):
+        return {}, {}
+    if meta.get("version") != VERSION or meta.get("count") != count:
+        print(f"{meta_path_for(output_path)} does not match {output_path}; doing a full refresh")
+        return {}, {}
+    return pages, by_url
+
+
+def plan_refresh(urls: List[str], bulk: BulkResolver, pages: Dict[str, dict]) -> Tuple[List[str], List[str]]:
+    # (URLs to fetch, URLs whose previous record still stands)
+    fetch, keep = [], []
+    for url in urls:
+        cap = bulk.lookup(url)
+        page = pages.get(url)
+        has_row = page is not None and (page.get("row") is not None or page.get("empty"))
+        if cap is not None and has_row and page.get("digest") == cap[3]:
+            keep.append(url)
+        else:
+            fetch.append(url)
+    return fetch, keep
+
+
+def write_meta(
+    output_path: str,
+    written: List[str],
+    urls: List[str],
+    bulk: BulkResolver,
+    kept: Dict[str, dict],
+    journaled: Container[str],
+) -> None:
+    # Record the capture behind each row of the freshly written <output>.
+    # `written` is Journal.ordered_keys() as compacted; `urls` adds the URLs that
+    # produced no record. Only URLs in `journaled` (this run's journal) get the
+    # current capture's digest; URLs in `kept` keep their previous entry (same
+    # digest, possibly an older timestamp than the current best capture, or
+    # the old digest of a record carried over after a failed refetch). Any
+    # other URL failed and is left out.
+    def entry(url: str, row: Optional[int]) -> Optional[dict]:
+        prev = kept.get(url)
+        if prev is not None:
+            ts, digest = prev.get("ts"), prev.get("digest")
+        elif url in journaled:
+            cap = bulk.lookup(url)
+            ts, digest = (cap[1], cap[3]) if cap else (None, None)
+        else:
+            return None
+        page = {"ts": ts, "digest": digest, "row": row}
+        if row is None:
+            page["empty"] = True
+        return page
+
+    pages = {}
+    for row, url in enumerate(written):
+        pages[url] = entry(url, row)
+    for url in urls:
+        if url not in pages:
+            page = entry(url, None)
+            if page is not None:
+                pages[url] = page
+    meta = {"version": VERSION, "count": len(written), "pages": pages}
+    atomic_write_json(meta_path_for(output_path), meta, indent=None, separators=(",", ":"))
+
+
+__all__ = [
+    "load_previous",
+    "meta_path_for",
+    "plan_refresh",
+    "write_meta",
+]
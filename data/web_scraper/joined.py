@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+from config import CFG
+from jsonstream import JsonArrayWriter, iter_json_array
+from snapshots import fold_title
+
+
+# Pre-joined pets: every talent, derby ability and card in a pet record is
+# replaced by the ID of the ability / spell it refers to, and each ability
+# and spell is described once, so a consumer needs nothing but this one file.
+#
+#   <output>.joined.json
+#     {"format": "pets-joined", "version": 2,
+#      "abilities": {id: {"name": str, "rarity": str | null, "icon": str, "resolved": bool}},
+#      "spells":    {id: {"name": str, "icon": str, "resolved": bool}},
+#      "pets": [pet, ...]}   with "abilities": {"talents": [id], "derby": [id]}, "cards": [id]
+#
+# Only abilities and spells some pet refers to are listed, in first-seen
+# order. The file is written without indentation, one pet at a time.
+#
+# Before joining, the name lists are cleaned of what the pet page's ability
+# table lets through besides ability links: rarity labels ("Uncommon",
+# "Ultra-Rare", ...) and empty image captions ("File:(Talent) .png").
+# Names are matched with snapshots.fold_title(loose=True), so "Move It%21"
+# in abilities.json joins "Move It!" in pets.json. IDs are UUID5s of the
+# folded name (per kind), stable across runs whether or not the name
+# resolved; an unresolved name keeps its ID and gets the wiki's
+# Special:FilePath icon guess, as the spell scraper does.
+
+RARITIES = ("Common", "Uncommon", "Rare", "Ultra-Rare", "Epic")
+_RARITY_FOLDS = {fold_title(r, loose=True) for r in RARITIES}
+_IMAGE_CAPTION_RE = re.compile(r"^File:\((Talent|Derby|Item Card)\)\s*(.*?)\s*\.png$", re.IGNORECASE)
+
+FORMAT = "pets-joined"
+VERSION = 2
+
+_NS = uuid.uuid5(uuid.NAMESPACE_URL, "wizard101.joined")
+_ICON_PREFIX = {"talents": "(Talent)", "derby": "(Derby)", "cards": "(Item Card)"}
+
+
+def ref_id(kind: str, name: str) -> str:
+    # kind: "ability" or "spell"
+    return str(uuid.uuid5(_NS, f"{kind}:{fold_title(name, loose=True)}"))
+
+
+def clean_titles(names: Optional[Iterable]) -> List[str]:
+    # Ability/card names as they should have been scraped: captions unwrapped
+    # or dropped, rarity labels dropped. Repeats stay (a pet can give the same
+    # card more than once).
+    out = []
+    for raw in names or []:
+        name = " ".join(str(raw).split())
+        m = _IMAGE_CAPTION_RE.match(name)
+        if m:
+            name = m.group(2)
+        folded = fold_title(name, loose=True)
+        if folded and folded not in _RARITY_FOLDS:
+            out.append(name)
+    return out
+
+
+def _index(records: Iterable[dict]) -> Dict[str, dict]:
+    # folded name -> record; rarity labels scraped as abilities are skipped,
+    # and of two records folding alike the one with more data wins
+    index = {}
+    for rec in records or []:
+        name = rec.get("name")
+        folded = fold_title(name or "", loose=True)
+        if not folded or folded in _RARITY_FOLDS:
+            continue
+        prev = index.get(folded)
+        score = (rec.get("icon") is not None) + (rec.get("rarity") is not None)
+        if prev is None or score > (prev.get("icon") is not None) + (prev.get("rarity") is not None):
+            index[folded] = rec
+    return index
+
+
+def _fallback_icon(field: str, name: str) -> str:
+    file_name = f"{_ICON_PREFIX[field]} {name}.png"
+    return f"https://{CFG['DOMAIN']}/wiki/Special:FilePath/{quote(file_name, safe='')}"
+
+
+class Joiner:
+    def __init__(self, spells: List[dict], abilities: List[dict]):
+        self.spells = _index(spells)
+        self.abilities = _index(abilities)
+        self.stats = Counter()
+        # id -> description, for every ability / spell referred to so far
+        self.refs: Dict[str, Dict[str, dict]] = {"ability": {}, "spell": {}}
+
+    def _ref(self, field: str, name: str) -> str:
+        kind = "spell" if field == "cards" else "ability"
+        table = self.spells if kind == "spell" else self.abilities
+        rec = table.get(fold_title(name, loose=True))
+        self.stats[f"{field}.{'resolved' if rec else 'unresolved'}"] += 1
+        rid = ref_id(kind, name)
+        seen = self.refs[kind]
+        if rid not in seen:
+            ref = {"name": name}
+            if kind == "ability":
+                ref["rarity"] = rec.get("rarity") if rec else None
+            ref["icon"] = (rec.get("icon") if rec else None) or _fallback_icon(field, name)
+            ref["resolved"] = rec is not None
+            seen[rid] = ref
+        return rid
+
+    def join(self, pet: dict) -> dict:
+        abilities = pet.get("abilities") or {}
+        out = dict(pet)
+        joined = {}
+        for field in ("talents", "derby"):
+            raw = abilities.get(field) or []
+            names = clean_titles(raw)
+            self.stats[f"{field}.dropped"] += len(raw) - len(names)
+            joined[field] = [self._ref(field, n) for n in names]
+        out["abilities"] = joined
+        raw = pet.get("cards") or []
+        cards = clean_titles(raw)
+        self.stats["cards.dropped"] += len(raw) - len(cards)
+        out["cards"] = [self._ref("cards", n) for n in cards]
+        return out
+
+
+def joined_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.joined.json
+    base = output_path[:-5] if output_path.endswith(".json") else output_path
+    return base + ".joined.json"
+
+
+def _load_list(path: str) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f) or []
+    except (OSError, ValueError):
+        return []
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def export_joined(pets_path: str, spells_path: str, abilities_path: str, out_path: Optional[str] = None) -> Counter:
+    # Stream pets.json through the joiner into <pets>.joined.json. The pets
+    # go to a side file first (the tables are only complete after the last
+    # pet) and are then copied into the document after the tables.
+    joiner = Joiner(_load_list(spells_path), _load_list(abilities_path))
+    out_path = out_path or joined_path_for(pets_path)
+    pets_tmp = out_path + ".pets"
+    try:
+        with JsonArrayWriter(pets_tmp, indent=None) as pets_out:
+            for pet in iter_json_array(pets_path):
+                pets_out.write(joiner.join(pet))
+        folder = os.path.dirname(out_path) or "."
+        tmp = os.path.join(folder, f".{os.path.basename(out_path)}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f'{{"format":{_dumps(FORMAT)},"version":{VERSION},')
+            f.write(f'"abilities":{_dumps(joiner.refs["ability"])},"spells":{_dumps(joiner.refs["spell"])},"pets":')
+            with open(pets_tmp, "r", encoding="utf-8") as src:
+                shutil.copyfileobj(src, f)
+            f.write("}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(pets_tmp):
+            os.remove(pets_tmp)
+    joiner.stats["pets"] = pets_out.count
+    joiner.stats["abilities"] = len(joiner.refs["ability"])
+    joiner.stats["spells"] = len(joiner.refs["spell"])
+    return joiner.stats
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = os.path.join(here, "..")
+    ap = argparse.ArgumentParser(description="Write pets with talents, derby and cards joined to their ability / spell records")
+    ap.add_argument("--pets", default=os.path.join(data, "pets.json"))
+    ap.add_argument("--spells", default=os.path.join(data, "spells.json"))
+    ap.add_argument("--abilities", default=os.path.join(data, "abilities.json"))
+    ap.add_argument("-o", "--output", help="default: <pets>.joined.json")
+    args = ap.parse_args(argv)
+
+    out = args.output or joined_path_for(args.pets)
+    stats = export_joined(args.pets, args.spells, args.abilities, out)
+    print(
+        f"Wrote {stats['pets']} joined pets, {stats['abilities']} abilities and {stats['spells']} spells "
+        f"to {out} ({os.path.getsize(out)} B)"
+    )
+    for field in ("talents", "derby", "cards"):
+        print(
+            f"  {field:<8} resolved={stats[field + '.resolved']} unresolved={stats[field + '.unresolved']} "
+            f"dropped={stats[field + '.dropped']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from jsonstream import JsonArrayWriter
+from metrics import METRICS
+
+
+def journal_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.journal.jsonl
+    base, _ = os.path.splitext(output_path)
+    return base + ".journal.jsonl"
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = 2, separators: Optional[tuple] = None) -> None:
+    # Write to a temp file in the same directory, fsync, then rename over `path`,
+    # so readers only ever see the old file or the complete new one.
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, separators=separators)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# Append-only JSONL log of scrape results, one line per input item:
+#   {"key": <url or title>, "record": {...} | null}
+# A null record marks an item that was looked at but produced nothing (e.g. no
+# archived capture), so resume skips it too. Lines are flushed on every append
+# and fsynced every `fsync_every` appends; a torn last line after a crash is
+# ignored on reload.
+#
+# Only keys and the byte offset of each key's latest record are kept in
+# memory; records are read back from the log when needed, so a run's memory
+# does not grow with the records it has written.
+class Journal:
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = 20):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.lock = threading.Lock()
+        self.keys: Set[str] = set()
+        self.offsets: Dict[str, int] = {}
+        self.pending = 0
+        self.reader = None
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if resume:
+            self._load()
+            self.f = open(path, "ab")
+        else:
+            self.f = open(path, "wb")
+
+    def _load(self) -> None:
+        good = 0
+        try:
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        break
+                    if not raw.endswith(b"\n"):
+                        break
+                    key = entry.get("key")
+                    self.keys.add(key)
+                    if entry.get("record") is not None:
+                        self.offsets[key] = good
+                    else:
+                        self.offsets.pop(key, None)
+                    good += len(raw)
+        except FileNotFoundError:
+            return
+        # drop a half-written tail so new appends start on a clean line
+        with open(self.path, "r+b") as f:
+            f.truncate(good)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def __len__(self) -> int:
+        # keys with a record
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, key: str, record: Optional[dict]) -> None:
+        with METRICS.timer("write"):
+            self._append(key, record)
+
+    def _append(self, key: str, record: Optional[dict]) -> None:
+        line = (json.dumps({"key": key, "record": record}, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            offset = self.f.tell()
+            self.f.write(line)
+            self.f.flush()
+            self.keys.add(key)
+            if record is not None:
+                self.offsets[key] = offset
+            else:
+                self.offsets.pop(key, None)
+            self.pending += 1
+            if self.pending >= self.fsync_every:
+                os.fsync(self.f.fileno())
+                self.pending = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        # The latest record journaled for `key`, read back from the log
+        with self.lock:
+            offset = self.offsets.get(key)
+            if offset is None:
+                return None
+            if self.reader is None:
+                self.reader = open(self.path, "rb")
+            self.reader.seek(offset)
+            return json.loads(self.reader.readline())["record"]
+
+    def sync(self) -> None:
+        with self.lock:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.pending = 0
+
+    def ordered_keys(self, order: Optional[List[str]] = None, carry: Optional[Dict[str, dict]] = None) -> List[str]:
+        # Keys with a record, in output order. With `order` (the input key
+        # list) records come out in input order even when a resumed run filled
+        # in earlier gaps last. `carry` holds records from a previous run for
+        # keys this run did not produce itself (incremental refresh).
+        with self.lock:
+            present = set(self.offsets)
+        present.update(k for k, r in (carry or {}).items() if r is not None)
+        seen = set()
+        out = []
+        for key in list(order or []) + list(self.offsets) + list(carry or {}):
+            if key in present and key not in seen:
+                seen.add(key)
+                out.append(key)
+        return out
+
+    def items(self, order: Optional[List[str]] = None, carry: Optional[Dict[str, dict]] = None) -> Iterator[tuple]:
+        # (key, record) pairs in ordered_keys() order, read one at a time
+        carry = carry or {}
+        for key in self.ordered_keys(order, carry):
+            record = self.get(key) if key in self.offsets else None
+            yield key, record if record is not None else carry[key]
+
+    def compact(self, output_path: str, order: Optional[List[str]] = None, carry: Optional[Dict[str, dict]] = None) -> int:
+        # Stream the collected records (see items()) into the usual indented
+        # JSON array.
+        self.sync()
+        with METRICS.timer("compact"), JsonArrayWriter(output_path) as out:
+            for _, record in self.items(order, carry):
+                out.write(record)
+        return out.count
+
+    def close(self) -> None:
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            if self.f.closed:
+                return
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.f.close()
+
+
+__all__ = [
+    "Journal",
+    "atomic_write_json",
+    "journal_path_for",
+]
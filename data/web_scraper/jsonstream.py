@@ -0,0 +1,137 @@
+import json
+import os
+from typing import Any, Iterator, Optional
+
+
+# Record-at-a-time I/O for the top-level JSON arrays the scraper writes
+# (pets.json, spells.json, abilities.json), so reading or writing a dataset
+# holds one record in memory rather than the whole list.
+
+_WS = " \t\r\n"
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    # Yield the elements of a JSON array file one by one. Only a window of the
+    # file around the current element is buffered.
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = 0
+        eof = not buf
+        first = True
+        after_comma = False
+        started = False
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            ch = buf[pos]
+            if not started:
+                if ch != "[":
+                    raise ValueError(f"{path}: expected a JSON array, found {ch!r}")
+                started = True
+                pos += 1
+                continue
+            if ch == "]":
+                if after_comma:
+                    raise ValueError(f"{path}: trailing ',' before ']'")
+                return
+            if not first:
+                if ch != ",":
+                    raise ValueError(f"{path}: expected ',' or ']' at element boundary, found {ch!r}")
+                pos += 1
+                first = after_comma = True
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                value, end = None, None
+            # an element cut off by the end of the buffer can still decode
+            # (a number like 2.5e3 read as 2), so only take it once the
+            # next delimiter is in the buffer too
+            if end is not None and not eof:
+                nxt = end
+                while nxt < len(buf) and buf[nxt] in _WS:
+                    nxt += 1
+                if nxt >= len(buf) or buf[nxt] not in ",]":
+                    end = None
+            if end is None:
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield value
+            pos = end
+            first = after_comma = False
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+class JsonArrayWriter:
+    # Write a JSON array one element at a time, byte-for-byte what
+    # json.dump(list, indent=indent, ensure_ascii=False) would produce. Like
+    # journal.atomic_write_json it writes a temp file and renames it over
+    # `path` on a clean close; on an exception the old file is left alone.
+    def __init__(self, path: str, indent: Optional[int] = 2):
+        self.path = path
+        self.indent = indent
+        self.count = 0
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+        self.tmp = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        self.f = open(self.tmp, "w", encoding="utf-8")
+        self.f.write("[")
+
+    def write(self, record: Any) -> None:
+        body = json.dumps(record, ensure_ascii=False, indent=self.indent)
+        if self.indent is None:
+            self.f.write(", " + body if self.count else body)
+        else:
+            pad = " " * self.indent
+            self.f.write(("," if self.count else "") + "\n" + pad + body.replace("\n", "\n" + pad))
+        self.count += 1
+
+    def close(self) -> None:
+        if self.f.closed:
+            return
+        if self.count and self.indent is not None:
+            self.f.write("\n")
+        self.f.write("]")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        if not self.f.closed:
+            self.f.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+__all__ = [
+    "JsonArrayWriter",
+    "iter_json_array",
+]
@@ -1,37 +1,27 @@
+import argparse
+import functools
+import os
 import re
-import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from config import CFG
 import json
-import time, random
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from cache import default_resolution_cache
+from crawl import DedupQueue, crawl
+from incremental import load_previous, plan_refresh, write_meta
+from journal import Journal, atomic_write_json, journal_path_for
+from jsonstream import iter_json_array
+from metrics import METRICS, Progress, report_path_for
+from pipeline import parse_pool, parse_workers, pipeline
+from snapshots import BulkResolver
+from transport import CONTROLLER, make_session, shared_session
 from urllib.parse import quote
 
 
-# Shared HTTP session with retries for resolver calls (used by Availability/CDX)
-def _make_session(total_retries: int = 3, backoff_factor: float = 0.8) -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=total_retries,
-        connect=total_retries,
-        read=total_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET", "HEAD"),
-        raise_on_status=False,
-    )
-    s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; PetScraper/1.0)"})
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    return s
-
-_SESSION = _make_session()
-
-
-
-def closest_snap_url(original):
-    r = _SESSION.get(CFG["WB_AVAIL"], params={"url": original}, timeout=CFG["TIMEOUT"])
+def closest_snap_url(original, timeout=None, session=None):
+    r = (session or shared_session()).get(CFG["WB_AVAIL"], params={"url": original}, timeout=timeout or CFG["TIMEOUT"])
     r.raise_for_status()
     j = r.json().get("archived_snapshots", {}).get("closest")
     return (j["url"] if j and j.get("available") else None)
@@ -45,7 +35,7 @@ def _toggle_scheme(url: str) -> str:
     return url
 
 
-def _cdx_best_ts(original: str, only_200: bool = True) -> str | None:
+def _cdx_best_ts(original: str, only_200: bool = True, strict: bool = False, timeout=None, session=None) -> str | None:
     params = {
         "url": original,
         "output": "json",
@@ -57,281 +47,867 @@ def _cdx_best_ts(original: str, only_200: bool = True) -> str | None:
     if only_200:
         params["filter"] = "statuscode:200"
     try:
-        r = _SESSION.get(CFG["CDX"], params=params, timeout=CFG["TIMEOUT"])
+        r = (session or shared_session()).get(CFG["CDX"], params=params, timeout=timeout or CFG["TIMEOUT"])
         r.raise_for_status()
         rows = r.json()
         if rows and len(rows) > 1:
             return rows[1][0]
     except Exception:
+        if strict:
+            raise
         return None
     return None
 
 
+# Built on first use rather than at import: spawned parse workers re-import
+# this module and need neither. Resolver calls share the scrapers' pooled,
+# rate-limited session.
+_BULK = None
+_BULK_LOCK = threading.Lock()
+
+
+def _bulk() -> BulkResolver:
+    global _BULK
+    with _BULK_LOCK:
+        if _BULK is None:
+            _BULK = BulkResolver(shared_session())
+        return _BULK
+
+
+def load_namespaces(*namespaces: str) -> None:
+    # Prime the bulk CDX index so get_archived_id_url answers these titles locally.
+    if not CFG.get("BULK_RESOLVE"):
+        return
+    for ns in namespaces:
+        try:
+            n = _bulk().load(ns)
+            print(f"Indexed {n} {ns}: URLs from CDX")
+        except Exception as e:
+            print(f"Bulk CDX listing for {ns}: failed ({e}); resolving per URL")
+
+
 def get_archived_id_url(original: str) -> str | None:
+    with METRICS.timer("resolve"):
+        source, id_url = _lookup_archived_id_url(original)
+    METRICS.incr(f"resolve.{source}")
+    return id_url
+
+
+def _lookup_archived_id_url(original: str) -> tuple[str, str | None]:
+    # (where the answer came from, id_url)
+    id_url = _bulk().resolve(original)
+    if id_url:
+        return "bulk", id_url
+    resolved = default_resolution_cache()
+    if resolved is not None:
+        found, id_url = resolved.lookup(original)
+        if found:
+            return ("cache" if id_url else "cache_negative"), id_url
+    id_url, definitive = _resolve_archived_id_url(original)
+    # only remember "no capture" when every lookup actually answered
+    if resolved is not None and (id_url or definitive):
+        resolved.store(original, id_url)
+    if id_url:
+        return "remote", id_url
+    return ("remote_none" if definitive else "remote_error"), None
+
+
+def flush_resolution_cache() -> None:
+    if CONTROLLER is not None:
+        print(f"Adaptive concurrency: {CONTROLLER.stats()}")
+    resolved = default_resolution_cache()
+    if resolved is None:
+        return
+    resolved.flush()
+    print(f"Resolution cache: {resolved.stats()}")
+
+
+def write_run_report(output_path: str, kind: str, **extra) -> None:
+    # JSON run report next to the output: stage histograms, counters, and the
+    # controller / resolution cache state at the end of the run.
+    flush_resolution_cache()
+    if not CFG.get("RUN_REPORT", True):
+        return
+    resolved = default_resolution_cache()
+    report = METRICS.report(
+        kind=kind,
+        output=output_path,
+        concurrency=CONTROLLER.stats() if CONTROLLER is not None else None,
+        resolution_cache=resolved.stats() if resolved is not None else None,
+        **extra,
+    )
+    path = report_path_for(output_path)
+    try:
+        atomic_write_json(path, report)
+    except OSError as e:
+        print(f"Run report write failed: {e}")
+        return
+    print(f"Run report: {path}")
+
+
+def _failed(err: Exception) -> None:
+    METRICS.incr(f"failed.{type(err).__name__}")
+
+
+def _id_url_from_available(url: str) -> str:
+    raw = re.sub(r"/web/(\d{10,14})([^/]*?)/", r"/web/\1id_/", url)
+    if raw.startswith("http://web.archive.org/"):
+        raw = "https://" + raw[len("http://"):]
+    return raw
+
+
+def _scheme_candidates(original: str) -> list[str]:
     candidates = []
     for cand in [original, _toggle_scheme(original)]:
         if cand not in candidates:
             candidates.append(cand)
+    return candidates
+
+
+def _resolve_archived_id_url(original: str) -> tuple[str | None, bool]:
+    if CFG.get("RESOLVE_CONCURRENT"):
+        return _resolve_concurrently(original)
+    definitive = True
+    candidates = _scheme_candidates(original)
     for cand in candidates:
         try:
             url = closest_snap_url(cand)
         except Exception:
             url = None
+            definitive = False
         if url:
-            raw = re.sub(r"/web/(\d{10,14})([^/]*?)/", r"/web/\1id_/", url)
-            if raw.startswith("http://web.archive.org/"):
-                raw = "https://" + raw[len("http://"):]
-            return raw
-    # Fallback to CDX latest 200
-    for cand in candidates:
-        ts = _cdx_best_ts(cand, only_200=True)
-        if ts:
-            return f"https://web.archive.org/web/{ts}id_/{cand}"
-    # Fallback to any capture
-    for cand in candidates:
-        ts = _cdx_best_ts(cand, only_200=False)
-        if ts:
-            return f"https://web.archive.org/web/{ts}id_/{cand}"
-    return None
+            return _id_url_from_available(url), True
+    # Fallback to CDX latest 200, then to any capture
+    for only_200 in (True, False):
+        for cand in candidates:
+            try:
+                ts = _cdx_best_ts(cand, only_200=only_200, strict=True)
+            except Exception:
+                ts = None
+                definitive = False
+            if ts:
+                return f"{CFG['WB_WEB']}/{ts}id_/{cand}", True
+    return None, definitive
+
+
+_RESOLVE_POOL = None
+_RESOLVE_SESSION = None
+_RESOLVE_POOL_LOCK = threading.Lock()
+# attempts per strategy in the concurrent resolver (hedges get one)
+_RESOLVE_RETRIES = 3
+_RESOLVE_BACKOFF = 0.8
+
+
+def _resolve_pool() -> tuple[ThreadPoolExecutor, object]:
+    # Pool and session for the concurrent resolver. The session shares the
+    # rate limiter and controller but does not retry by itself, so an
+    # abandoned lookup stops at its next attempt instead of running urllib3's
+    # retries to the end.
+    global _RESOLVE_POOL, _RESOLVE_SESSION
+    with _RESOLVE_POOL_LOCK:
+        if _RESOLVE_POOL is None:
+            _RESOLVE_POOL = ThreadPoolExecutor(max_workers=CFG.get("RESOLVE_WORKERS", 16), thread_name_prefix="resolve")
+            _RESOLVE_SESSION = make_session(total_retries=0)
+        return _RESOLVE_POOL, _RESOLVE_SESSION
+
+
+class _Abandoned(Exception):
+    pass
+
+
+def _resolve_concurrently(original: str) -> tuple[str | None, bool]:
+    # Same strategies and priority as the sequential resolver (availability
+    # per scheme, then CDX latest 200 per scheme, then CDX any capture per
+    # scheme), up to RESOLVE_INFLIGHT of them running at once, started in
+    # priority order. An answer is taken as soon as every higher-priority
+    # strategy has come back empty; everything else is then abandoned and
+    # stops before its next request. A strategy still running
+    # RESOLVE_HEDGE_AFTER seconds after it actually started (time queued for
+    # the pool does not count) gets one single-shot duplicate request, and the
+    # first of the two to answer counts.
+    timeout = CFG.get("RESOLVE_TIMEOUT")
+    hedge_after = CFG.get("RESOLVE_HEDGE_AFTER")
+    inflight = max(1, int(CFG.get("RESOLVE_INFLIGHT") or 1))
+    pool, session = _resolve_pool()
+    candidates = _scheme_candidates(original)
+
+    def available(cand):
+        url = closest_snap_url(cand, timeout=timeout, session=session)
+        return _id_url_from_available(url) if url else None
+
+    def cdx(cand, only_200):
+        ts = _cdx_best_ts(cand, only_200=only_200, strict=True, timeout=timeout, session=session)
+        return f"{CFG['WB_WEB']}/{ts}id_/{cand}" if ts else None
+
+    strategies = [functools.partial(available, c) for c in candidates]
+    for only_200 in (True, False):
+        strategies += [functools.partial(cdx, c, only_200) for c in candidates]
+
+    stop = threading.Event()
+    # per strategy: when its first attempt began running
+    began: list = [None] * len(strategies)
+
+    def run(i: int, tries: int):
+        if began[i] is None:
+            began[i] = time.monotonic()
+        for n in range(tries):
+            if stop.is_set():
+                raise _Abandoned()
+            try:
+                return strategies[i]()
+            except Exception:
+                if n == tries - 1 or stop.is_set():
+                    raise
+                stop.wait(_RESOLVE_BACKOFF * 2**n)
+
+    attempts: list = [[] for _ in strategies]
+    # per strategy: None while undecided, else (answer, failed)
+    outcome: list = [None] * len(strategies)
+    try:
+        while True:
+            for i, futs in enumerate(attempts):
+                if outcome[i] is not None or not futs:
+                    continue
+                done = [f for f in futs if f.done()]
+                answered = [f for f in done if f.exception() is None]
+                if answered:
+                    outcome[i] = (answered[0].result(), False)
+                elif len(done) == len(futs):
+                    outcome[i] = (None, True)
+
+            for i in range(len(outcome)):
+                if outcome[i] is None:
+                    break
+                if outcome[i][0]:
+                    return outcome[i][0], True
+            else:
+                return None, not any(failed for _, failed in outcome)
+
+            # fill free slots: hedges of overdue strategies first, then the
+            # next strategies not yet started, both in priority order
+            now = time.monotonic()
+            running = [f for futs in attempts for f in futs if not f.done()]
+            wait_for = None
+            for i, futs in enumerate(attempts):
+                if len(running) >= inflight:
+                    break
+                if outcome[i] is not None or len(futs) != 1 or not hedge_after:
+                    continue
+                if began[i] is None:
+                    wait_for = 0.25 if wait_for is None else min(wait_for, 0.25)
+                elif now - began[i] >= hedge_after:
+                    futs.append(pool.submit(run, i, 1))
+                    running.append(futs[-1])
+                    METRICS.incr("resolve.hedged")
+                else:
+                    due = began[i] + hedge_after - now
+                    wait_for = due if wait_for is None else min(wait_for, due)
+            for i, futs in enumerate(attempts):
+                if len(running) >= inflight:
+                    break
+                if not futs:
+                    futs.append(pool.submit(run, i, _RESOLVE_RETRIES))
+                    running.append(futs[-1])
+            if running:
+                wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+    finally:
+        stop.set()
+        for futs in attempts:
+            for f in futs:
+                f.cancel()
+
+
+# Set by the --profile switch; profiling keeps parsing in this process so the
+# profiler sees it.
+_PROFILER = None
+
+
+def _workers(concurrency: int | None) -> int:
+    # Crawl pool size for a scrape. In adaptive mode an explicit concurrency
+    # is where the controller starts and its ceiling; without one it starts
+    # at CONCURRENCY and may grow to MAX_CONCURRENCY.
+    if CONTROLLER is None:
+        return CFG["CONCURRENCY"] if concurrency is None else max(1, concurrency)
+    if concurrency is None:
+        CONTROLLER.configure(CFG["CONCURRENCY"], CFG.get("MAX_CONCURRENCY", 16))
+    else:
+        CONTROLLER.configure(concurrency, concurrency)
+    return CONTROLLER.maximum
+
+
+def _parse_pool():
+    # One extractor pool for every stage of a run, or None when parsing stays
+    # in the crawl workers (profiling, or PARSE_PROCESSES = 0)
+    if _PROFILER is not None or parse_workers() <= 0:
+        return None
+    return parse_pool()
+
+
+def _stages(items, fetch_job, extract, kind: str, workers: int, pool=None):
+    # With PARSE_PROCESSES set, fetch and parse run as separate pipeline
+    # stages (parsing on a process pool, `pool` if given); otherwise each
+    # crawl worker does resolve+fetch+parse in turn. Both yield
+    # (item, record, error) in order.
+    if _PROFILER is not None:
+        extract = _PROFILER.wrap(extract)
+    elif parse_workers() > 0:
+        return pipeline(items, fetch_job, kind, fetchers=workers, controller=CONTROLLER, pool=pool)
+
+    def job(item):
+        id_url, content, record = fetch_job(item)
+        return extract(content, id_url) if content is not None else record
+
+    return crawl(items, job, workers, controller=CONTROLLER)
+
+
+def _record_pet(journal: Journal, original_url: str, pet: dict | None, err: Exception | None) -> bool:
+    # Journal one crawl result; True if it produced a pet record
+    if err is not None:
+        # not journaled, so a resumed run retries it
+        _failed(err)
+        print(f"Error scraping {original_url}: {err}")
+        return False
+    journal.append(original_url, pet)
+    if pet is None:
+        METRICS.incr("skipped.no_capture")
+        print("No archived capture found. Skipping.")
+        return False
+    METRICS.incr("scraped")
+    return True
+
+
+def _record_spell(journal: Journal, spell: str, obj: dict | None, err: Exception | None) -> None:
+    if err is not None:
+        _failed(err)
+        print(f"Error scraping spell {spell}: {err}")
+        return
+    journal.append(spell, obj)
+    METRICS.incr("scraped" if obj.get("source") else "scraped.fallback_icon")
+
+
+def _record_ability(journal: Journal, ability: str, obj: dict | None, err: Exception | None) -> None:
+    if err is not None:
+        _failed(err)
+        print(f"Error scraping ability {ability}: {err}")
+        return
+    journal.append(ability, obj)
+    if obj is None:
+        METRICS.incr("skipped.no_capture")
+        print(f"couldn't resolve {ability}")
+        return
+    print(obj)
+    METRICS.incr("scraped")
+
 
+def _fetch_pet(scraper, original_url: str):
+    id_url = get_archived_id_url(original_url)
+    if not id_url:
+        return None, None, None
+    return id_url, scraper.fetch_page(id_url), None
 
 
-def scrape_pets(output_path: str = "./data/pets.json") -> None:
+def scrape_pets(
+    output_path: str = "./data/pets.json",
+    concurrency: int | None = None,
+    resume: bool = False,
+    refresh: bool = False,
+) -> None:
+    # refresh=True: keep the records of pages whose CDX digest matches the
+    # one recorded in <output>.meta.json, fetch only new and changed pages
     from pets import PetScraper
 
+    METRICS.reset()
     scraper = PetScraper()
-    p_urls = scraper.list_pet_original_urls()
+    load_namespaces("Pet")
+    p_urls = _bulk().originals("Pet") or scraper.list_pet_original_urls()
+    workers = _workers(concurrency)
+
+    pages, previous = {}, {}
+    wanted = p_urls
+    if refresh:
+        if not _bulk().originals("Pet"):
+            print("No bulk CDX listing to compare digests against; doing a full refresh")
+        else:
+            pages, previous = load_previous(output_path)
+            wanted, unchanged = plan_refresh(p_urls, _bulk(), pages)
+            METRICS.incr("skipped.unchanged", len(unchanged))
+            print(f"Refresh: {len(unchanged)} pets unchanged, {len(wanted)} new or changed")
+
+    journal = Journal(journal_path_for(output_path), resume=resume)
+    todo = [u for u in wanted if u not in journal]
+    if resume:
+        print(f"Resuming: {len(journal)} pets journaled, {len(todo)} URLs left")
+    progress = Progress("Pets", len(wanted), len(wanted) - len(todo))
+
+    with journal:
+        stages = _stages(todo, lambda u: _fetch_pet(scraper, u), scraper.extract_pet_obj, "pet", workers)
+        for original_url, pet, err in stages:
+            progress.tick()
+            _record_pet(journal, original_url, pet, err)
+
+        # previous records stand for every URL this run did not journal: the
+        # unchanged ones and those whose refetch failed (retried next refresh,
+        # since their entry keeps the old digest)
+        carry = {u: r for u, r in previous.items() if u not in journal and r is not None}
+        kept = {u: p for u, p in pages.items() if u not in journal and (u in carry or p.get("empty"))}
+        written = journal.compact(output_path, order=p_urls, carry=carry)
+        write_meta(output_path, journal.ordered_keys(p_urls, carry), p_urls, _bulk(), kept, journal)
+    print(f"Wrote {written} pets to {output_path}")
+    _export_pets(output_path)
+    _export_search_index(output_path)
+    _export_joined(output_path)
+    write_run_report(output_path, "pets", items=len(p_urls), written=written, fetched=len(wanted))
+
+
+def _export_pets(output_path: str) -> None:
+    # Derived formats written next to pets.json (EXPORT_COMPACT /
+    # EXPORT_COLUMNS / EXPORT_SHARDS)
+    if not (CFG.get("EXPORT_COMPACT") or CFG.get("EXPORT_COLUMNS") or CFG.get("EXPORT_SHARDS")):
+        return
+    with open(output_path, "r", encoding="utf-8") as f:
+        pets = json.load(f)
 
-    collected = []
-    successes_since_flush = 0
-    count = 0
+    if CFG.get("EXPORT_COMPACT"):
+        from compact import compact_path_for, export_compact
+
+        path = compact_path_for(output_path)
+        try:
+            with METRICS.timer("export"):
+                export_compact(pets, path)
+        except (KeyError, ValueError) as e:
+            METRICS.incr("failed.export_compact")
+            print(f"Compact export skipped: {e}")
+        else:
+            print(f"Wrote compact pets to {path}")
 
-    # keeping unique list of spells as I go
+    if CFG.get("EXPORT_COLUMNS"):
+        from columns import columns_path_for, export_columns
 
-    for original_url in p_urls:
+        path = columns_path_for(output_path)
         try:
-            time.sleep(random.uniform(0.2, 0.7))
-            id_url = get_archived_id_url(original_url)
-            if not id_url:
-                print("No archived capture found. Skipping.")
-                continue
+            with METRICS.timer("export"):
+                export_columns(pets, path)
+        except (OSError, ValueError) as e:
+            METRICS.incr("failed.export_columns")
+            print(f"Column export skipped: {e}")
+        else:
+            print(f"Wrote typed pet columns to {path}")
 
-            pet = scraper.build_pet_obj(id_url)
-            collected.append(pet)
-            count += 1
-            successes_since_flush += 1
-            print(f"Count: {count}")
-            if successes_since_flush % 20 == 0:
-                try:
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(collected, f, ensure_ascii=False, indent=2)
-                    print(f"Checkpoint saved at {len(collected)} pets")
+    if CFG.get("EXPORT_SHARDS"):
+        from shards import export_shards, shard_dir_for
 
+        path = shard_dir_for(output_path)
+        try:
+            with METRICS.timer("export"):
+                manifest = export_shards(pets, path)
+        except (OSError, ValueError) as e:
+            METRICS.incr("failed.export_shards")
+            print(f"Sharded export skipped: {e}")
+        else:
+            print(f"Wrote {len(manifest['shards'])} pet shards + manifest to {path}")
 
-                except Exception as e:
-                    print(f"Checkpoint write failed: {e}")
-        except Exception as e:
-            print(f"Error scraping {original_url}: {e}")
-            continue
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(collected, f, ensure_ascii=False, indent=2)
-    print(f"Wrote {len(collected)} pets to {output_path}")
+def _export_search_index(output_path: str) -> None:
+    # Rebuild the typeahead index from whichever of pets/spells/abilities.json
+    # sit next to the file just written (SEARCH_INDEX)
+    if not CFG.get("SEARCH_INDEX"):
+        return
+    from search_index import build_index
+
+    folder = os.path.dirname(output_path) or "."
+    loaded = []
+    for name in ("pets", "spells", "abilities"):
+        try:
+            with open(os.path.join(folder, f"{name}.json"), "r", encoding="utf-8") as f:
+                loaded.append(json.load(f))
+        except (OSError, ValueError):
+            loaded.append([])
+    if not any(loaded):
+        return
+    path = os.path.join(folder, "search_index.json")
+    with METRICS.timer("export"):
+        index = build_index(*loaded)
+        atomic_write_json(path, index, indent=None, separators=(",", ":"))
+    print(f"Wrote search index ({len(index['docs'])} names) to {path}")
 
 
+def _export_joined(output_path: str) -> None:
+    # Rebuild pets.joined.json next to the file just written (EXPORT_JOINED)
+    if not CFG.get("EXPORT_JOINED"):
+        return
+    from joined import export_joined
 
-def collect_spell_list_from_pets(pets_json_path: str = "./data/pets.json") -> list[str]:
+    folder = os.path.dirname(output_path) or "."
+    pets_path = os.path.join(folder, "pets.json")
+    if not os.path.exists(pets_path):
+        return
     try:
-        pets = json.load(open(pets_json_path, "r", encoding="utf-8"))
-    except Exception:
-        return []
+        with METRICS.timer("export"):
+            stats = export_joined(pets_path, os.path.join(folder, "spells.json"), os.path.join(folder, "abilities.json"))
+    except (OSError, ValueError) as e:
+        METRICS.incr("failed.export_joined")
+        print(f"Joined export skipped: {e}")
+        return
+    unresolved = sum(v for k, v in stats.items() if k.endswith(".unresolved"))
+    print(f"Wrote {stats['pets']} joined pets ({unresolved} names without an ability/spell record)")
 
-    seen, out = set(), []
-    for pet in (pets or []):
-        for name in (pet.get("cards") or []):
-            base = " ".join(str(name).split()).strip()
-            s = base.replace(" ", "_") if base else ""
-            if s and s not in seen:
-                seen.add(s)
-                out.append(s)
-    return out
 
+def _title(name) -> str:
+    base = " ".join(str(name).split()).strip()
+    return base.replace(" ", "_") if base else ""
 
-def scrape_spells(output_path: str = "./data/spells.json") -> None:
-    from spells import SpellScraper
 
-    scraper = SpellScraper()
+def _spell_titles(pet: dict) -> list[str]:
+    return [t for t in map(_title, pet.get("cards") or []) if t]
+
+
+def _ability_titles(pet: dict) -> list[str]:
+    abilities = pet.get("abilities") or {}
+    names = (abilities.get("talents") or []) + (abilities.get("derby") or [])
+    return [t for t in map(_title, names) if t]
+
+
+def collect_titles_from_pets(pets_json_path: str = "./data/pets.json") -> tuple[list[str], list[str]]:
+    # (spell titles, ability titles) in first-seen order, from one streaming
+    # pass over pets.json
+    spells, abilities = {}, {}
+    try:
+        for pet in iter_json_array(pets_json_path):
+            if not isinstance(pet, dict):
+                continue
+            spells.update(dict.fromkeys(_spell_titles(pet)))
+            abilities.update(dict.fromkeys(_ability_titles(pet)))
+    except (OSError, ValueError):
+        return [], []
+    return list(spells), list(abilities)
+
+
+def collect_spell_list_from_pets(pets_json_path: str = "./data/pets.json") -> list[str]:
+    return collect_titles_from_pets(pets_json_path)[0]
+
+
+def _match_title(namespaces: tuple, title: str) -> tuple[str | None, tuple]:
+    # One local lookup in the bulk listings' title index instead of probing
+    # each title variant / namespace with get_archived_id_url. Returns the
+    # id_url and the namespaces still worth probing per URL: a miss in a
+    # listing that loaded is final, only unlisted namespaces are left.
+    with METRICS.timer("resolve"):
+        id_url = _bulk().resolve_title(namespaces, title)
+    if id_url:
+        METRICS.incr("resolve.title_index")
+        return id_url, ()
+    unlisted = tuple(ns for ns in namespaces if not _bulk().loaded(ns))
+    if not unlisted:
+        METRICS.incr("resolve.title_index_miss")
+    return None, unlisted
+
+
+def _fetch_spell(scraper, spell: str):
+    encoded = quote(spell, safe="")
+    id_url, unlisted = _match_title(("ItemCard", "Spell"), spell)
+    for ns in unlisted:
+        id_url = get_archived_id_url(f"https://{CFG['DOMAIN']}/wiki/{ns}:{encoded}")
+        if id_url:
+            break
+    if not id_url:
+        # Fallback: construct icon via Special:FilePath and do not skip
+        file_name = f"(Item Card) {spell.replace('_', ' ')}.png"
+        icon = f"https://{CFG['DOMAIN']}/wiki/Special:FilePath/{quote(file_name, safe='')}"
+        return None, None, {"name": spell.replace('_', ' '), "icon": icon, "source": None}
+    return id_url, scraper.fetch_page(id_url), None
+
+
+def scrape_spells(
+    output_path: str = "./data/spells.json",
+    concurrency: int | None = None,
+    resume: bool = False,
+) -> None:
     spell_list = collect_spell_list_from_pets()
     if not spell_list:
         print("No spells discovered from pets.json. Nothing to scrape.")
         return
+    scrape_spells_from_list(spell_list, output_path, concurrency, resume)
+
 
-    collected = []
-    successes_since_flush = 0
-    count = 0
-
-    for spell in spell_list:
-        time.sleep(random.uniform(0.2, 0.7))
-        encoded = quote(spell, safe="")
-        candidates = [
-            f"https://{CFG['DOMAIN']}/wiki/ItemCard:{encoded}",
-            f"https://{CFG['DOMAIN']}/wiki/Spell:{encoded}",
-        ]
-        id_url = None
-        for orig in candidates:
-            id_url = get_archived_id_url(orig)
+def collect_ability_list_from_pets(pets_json_path: str = "./data/pets.json") -> list[str]:
+    return collect_titles_from_pets(pets_json_path)[1]
+
+
+def _fetch_ability(scraper, ability: str):
+    # Try multiple title variants to improve Wayback hit rate
+    variants = []
+    variants.append(ability)
+    if ability:
+        variants.append(ability[0:1].upper() + ability[1:])
+    parts = ability.split("_") if ability else []
+    if parts:
+        variants.append("_".join(w[:1].upper() + w[1:] if w else w for w in parts))
+    seen_var = set()
+    variants = [v for v in variants if not (v in seen_var or seen_var.add(v))]
+
+    id_url, unlisted = _match_title(("PetAbility",), ability)
+    if unlisted:
+        for v in variants:
+            encoded = quote(v, safe="")
+            original_url = f"https://{CFG['DOMAIN']}/wiki/PetAbility:{encoded}"
+            id_url = get_archived_id_url(original_url)
             if id_url:
                 break
-        if not id_url:
-            # Fallback: construct icon via Special:FilePath and do not skip
-            file_name = f"(Item Card) {spell.replace('_', ' ')}.png"
-            icon = f"https://{CFG['DOMAIN']}/wiki/Special:FilePath/{quote(file_name, safe='')}"
-            curr_spell = {"name": spell.replace('_', ' '), "icon": icon, "source": None}
-        else:
-            curr_spell = scraper.build_spell_obj(id_url)
-        collected.append(curr_spell)
-        count += 1
-        successes_since_flush += 1
-        print(f"Spells scraped: {count}")
-        if successes_since_flush % 20 == 0:
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(collected, f, ensure_ascii=False, indent=2)
-            print(f"Spell checkpoint saved at {len(collected)} entries")
+    if not id_url:
+        return None, None, None
+    return id_url, scraper.fetch_page(id_url), None
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(collected, f, ensure_ascii=False, indent=2)
-    print(f"Wrote {len(collected)} spells to {output_path}")
 
-
-def collect_ability_list_from_pets(pets_json_path: str = "./data/pets.json") -> list[str]:
-    try:
-        pets = json.load(open(pets_json_path, "r", encoding="utf-8"))
-    except Exception:
-        return []
-    seen, out = set(), []
-    for pet in (pets or []):
-        abilities = pet.get("abilities") or {}
-        for bucket in (abilities.get("talents") or []), (abilities.get("derby") or []):
-            for name in bucket:
-                base = " ".join(str(name).split()).strip()
-                s = base.replace(" ", "_") if base else ""
-                if s and s not in seen:
-                    seen.add(s)
-                    out.append(s)
-    return out
-
-
-def scrape_abilities(output_path: str = "./data/abilities.json") -> None:
+def scrape_abilities(
+    output_path: str = "./data/abilities.json",
+    concurrency: int | None = None,
+    resume: bool = False,
+) -> None:
     from abilities import AbilityScraper
 
+    METRICS.reset()
     scraper = AbilityScraper()
     ability_list = collect_ability_list_from_pets()
-    
-    collected = []
-    successes_since_flush = 0
-    count = 0
-
-    for ability in ability_list:
-        try:
-            time.sleep(random.uniform(0.2, 0.7))
-            # Try multiple title variants to improve Wayback hit rate
-            variants = []
-            variants.append(ability)
-            if ability:
-                variants.append(ability[0:1].upper() + ability[1:])
-            parts = ability.split("_") if ability else []
-            if parts:
-                variants.append("_".join(w[:1].upper() + w[1:] if w else w for w in parts))
-            seen_var = set()
-            variants = [v for v in variants if not (v in seen_var or seen_var.add(v))]
-
-            id_url = None
-            for v in variants:
-                encoded = quote(v, safe="")
-                original_url = f"https://{CFG['DOMAIN']}/wiki/PetAbility:{encoded}"
-                id_url = get_archived_id_url(original_url)
-                if id_url:
-                    break
-            if not id_url:
-                # Fallback: minimal object without icon/source
-                print(f"couldn't resolve {ability}")
-            else:
-                obj = scraper.build_ability_obj(id_url)
-                print(obj)
-                collected.append(obj)
-                count += 1
-                successes_since_flush += 1
-            print(f"Abilities scraped: {count}")
-            if successes_since_flush % 20 == 0:
-                try:
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(collected, f, ensure_ascii=False, indent=2)
-                    print(f"Ability checkpoint saved at {len(collected)} entries")
-                except Exception as e:
-                    print(f"Ability checkpoint write failed: {e}")
-        except Exception as e:
-            print(f"Error scraping ability {ability}: {e}")
-            continue
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(collected, f, ensure_ascii=False, indent=2)
-    print(f"Wrote {len(collected)} abilities to {output_path}")
+    load_namespaces("PetAbility")
+    workers = _workers(concurrency)
+
+    journal = Journal(journal_path_for(output_path), resume=resume)
+    todo = [a for a in ability_list if a not in journal]
+    if resume:
+        print(f"Resuming: {len(journal)} abilities journaled, {len(todo)} left")
+    progress = Progress("Abilities", len(ability_list), len(ability_list) - len(todo))
+
+    with journal:
+        stages = _stages(todo, lambda a: _fetch_ability(scraper, a), scraper.extract_ability_obj, "ability", workers)
+        for ability, obj, err in stages:
+            progress.tick()
+            _record_ability(journal, ability, obj, err)
+
+        written = journal.compact(output_path, order=ability_list)
+    print(f"Wrote {written} abilities to {output_path}")
+    _export_search_index(output_path)
+    _export_joined(output_path)
+    write_run_report(output_path, "abilities", items=len(ability_list), written=written)
     
 
 
-def scrape_spells_from_list(spell_list: list[str], output_path: str = "./data/spells.json") -> None:
+def scrape_spells_from_list(
+    spell_list: list[str],
+    output_path: str = "./data/spells.json",
+    concurrency: int | None = None,
+    resume: bool = False,
+) -> None:
     from spells import SpellScraper
 
+    METRICS.reset()
     scraper = SpellScraper()
-    collected = []
-    successes_since_flush = 0
-    count = 0
+    load_namespaces("ItemCard", "Spell")
+    workers = _workers(concurrency)
+
+    journal = Journal(journal_path_for(output_path), resume=resume)
+    todo = [s for s in spell_list if s not in journal]
+    if resume:
+        print(f"Resuming: {len(journal)} spells journaled, {len(todo)} left")
+    progress = Progress("Spells", len(spell_list), len(spell_list) - len(todo))
+
+    with journal:
+        stages = _stages(todo, lambda s: _fetch_spell(scraper, s), scraper.extract_spell_obj, "spell", workers)
+        for spell, obj, err in stages:
+            progress.tick()
+            _record_spell(journal, spell, obj, err)
+
+        written = journal.compact(output_path, order=spell_list)
+    print(f"Wrote {written} spells to {output_path}")
+    _export_search_index(output_path)
+    _export_joined(output_path)
+    write_run_report(output_path, "spells", items=len(spell_list), written=written)
+ 
 
-    for spell in spell_list:
+
+def _stage_thread(name: str, body, errors: list) -> threading.Thread:
+    def run():
         try:
-            time.sleep(random.uniform(0.2, 0.7))
-            encoded = quote(spell, safe="")
-            candidates = [
-                f"https://{CFG['DOMAIN']}/wiki/ItemCard:{encoded}",
-                f"https://{CFG['DOMAIN']}/wiki/Spell:{encoded}",
-            ]
-            id_url = None
-            for orig in candidates:
-                id_url = get_archived_id_url(orig)
-                if id_url:
-                    break
-            if not id_url:
-                # Fallback: use Special:FilePath without skipping
-                file_name = f"(Item Card) {spell.replace('_', ' ')}.png"
-                icon = f"https://{CFG['DOMAIN']}/wiki/Special:FilePath/{quote(file_name, safe='')}"
-                obj = {"name": spell.replace('_', ' '), "icon": icon, "source": None}
-            else:
-                obj = scraper.build_spell_obj(id_url)
-            collected.append(obj)
-            count += 1
-            successes_since_flush += 1
-            print(f"Spells scraped: {count}")
-            if successes_since_flush % 20 == 0:
-                try:
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        json.dump(collected, f, ensure_ascii=False, indent=2)
-                    print(f"Spell checkpoint saved at {len(collected)} entries")
-                except Exception as e:
-                    print(f"Spell checkpoint write failed: {e}")
-        except Exception as e:
-            print(f"Error scraping spell {spell}: {e}")
-            continue
+            body()
+        except BaseException as e:
+            errors.append(e)
+
+    t = threading.Thread(target=run, name=name, daemon=True)
+    t.start()
+    return t
+
+
+def scrape_all(
+    output_path: str = "./data/pets.json",
+    concurrency: int | None = None,
+    resume: bool = False,
+) -> None:
+    # Pets, spells and abilities in one pipelined run: every pet record feeds
+    # its card and ability titles into deduplicating queues that the spell and
+    # ability crawls work through while pets are still being fetched. All
+    # three share the session, rate limiter, concurrency controller and parse
+    # pool, and spells.json / abilities.json are written next to `output_path`.
+    from abilities import AbilityScraper
+    from pets import PetScraper
+    from spells import SpellScraper
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(collected, f, ensure_ascii=False, indent=2)
-    print(f"Wrote {len(collected)} spells to {output_path}")
- 
+    METRICS.reset()
+    folder = os.path.dirname(output_path) or "."
+    spells_path = os.path.join(folder, "spells.json")
+    abilities_path = os.path.join(folder, "abilities.json")
+    pet_scraper = PetScraper()
+    spell_scraper = SpellScraper()
+    ability_scraper = AbilityScraper()
+    load_namespaces("Pet", "ItemCard", "Spell", "PetAbility")
+    p_urls = _bulk().originals("Pet") or pet_scraper.list_pet_original_urls()
+    workers = _workers(concurrency)
+
+    spell_q, ability_q = DedupQueue(), DedupQueue()
+
+    def discovered(pet: dict) -> None:
+        for t in _spell_titles(pet):
+            spell_q.put(t)
+        for t in _ability_titles(pet):
+            ability_q.put(t)
+
+    pet_journal = Journal(journal_path_for(output_path), resume=resume)
+    spell_journal = Journal(journal_path_for(spells_path), resume=resume)
+    ability_journal = Journal(journal_path_for(abilities_path), resume=resume)
+    todo = [u for u in p_urls if u not in pet_journal]
+    for url in p_urls:
+        pet = pet_journal.get(url)
+        if pet is not None:
+            discovered(pet)
+    if resume:
+        print(
+            f"Resuming: {len(pet_journal)} pets, {len(spell_journal)} spells, "
+            f"{len(ability_journal)} abilities journaled, {len(todo)} pet URLs left"
+        )
+
+    def spells_stage():
+        progress = Progress("Spells", 0)
+        items = (s for s in spell_q if s not in spell_journal)
+        stages = _stages(items, lambda s: _fetch_spell(spell_scraper, s), spell_scraper.extract_spell_obj, "spell", workers, pool)
+        for spell, obj, err in stages:
+            progress.total = len(spell_q)
+            progress.tick()
+            _record_spell(spell_journal, spell, obj, err)
+
+    def abilities_stage():
+        progress = Progress("Abilities", 0)
+        items = (a for a in ability_q if a not in ability_journal)
+        stages = _stages(items, lambda a: _fetch_ability(ability_scraper, a), ability_scraper.extract_ability_obj, "ability", workers, pool)
+        for ability, obj, err in stages:
+            progress.total = len(ability_q)
+            progress.tick()
+            _record_ability(ability_journal, ability, obj, err)
+
+    errors: list = []
+    # the three stages share one parse pool: each job names its extractor
+    pool = _parse_pool()
+    with pet_journal, spell_journal, ability_journal:
+        threads = [_stage_thread("spells", spells_stage, errors), _stage_thread("abilities", abilities_stage, errors)]
+        progress = Progress("Pets", len(p_urls), len(p_urls) - len(todo))
+        try:
+            stages = _stages(todo, lambda u: _fetch_pet(pet_scraper, u), pet_scraper.extract_pet_obj, "pet", workers, pool)
+            for original_url, pet, err in stages:
+                progress.tick()
+                if _record_pet(pet_journal, original_url, pet, err):
+                    discovered(pet)
+        finally:
+            spell_q.close()
+            ability_q.close()
+            for t in threads:
+                t.join()
+            if pool is not None:
+                pool.shutdown()
+        if errors:
+            raise errors[0]
+
+        written = pet_journal.compact(output_path, order=p_urls)
+        print(f"Wrote {written} pets to {output_path}")
+        # same order the sequential spells / abilities passes would use
+        spell_order, ability_order = collect_titles_from_pets(output_path)
+        n_spells = spell_journal.compact(spells_path, order=spell_order)
+        print(f"Wrote {n_spells} spells to {spells_path}")
+        n_abilities = ability_journal.compact(abilities_path, order=ability_order)
+        print(f"Wrote {n_abilities} abilities to {abilities_path}")
+        write_meta(output_path, pet_journal.ordered_keys(p_urls), p_urls, _bulk(), {}, pet_journal)
+
+    _export_pets(output_path)
+    _export_search_index(output_path)
+    _export_joined(output_path)
+    write_run_report(
+        output_path,
+        "all",
+        items=len(p_urls),
+        written=written,
+        spells={"items": len(spell_q), "written": n_spells},
+        abilities={"items": len(ability_q), "written": n_abilities},
+    )
 
 
-if __name__ == "__main__":
-  #  scrape_pets()
-#  scrape_spells()
-  scrape_abilities()
- 
+_TARGETS = {
+    "all": (scrape_all, "./data/pets.json"),
+    "pets": (scrape_pets, "./data/pets.json"),
+    "spells": (scrape_spells, "./data/spells.json"),
+    "abilities": (scrape_abilities, "./data/abilities.json"),
+}
+
+
+def _cli(argv=None) -> None:
+    global _PROFILER
+    ap = argparse.ArgumentParser(description="Scrape pets, spells or abilities from Wayback snapshots of the wiki")
+    ap.add_argument("target", nargs="?", default="abilities", choices=sorted(_TARGETS))
+    ap.add_argument("-o", "--output", help="output JSON path (default: ./data/<target>.json)")
+    ap.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="requests in flight (default: CONCURRENCY); with ADAPTIVE the controller starts here and never exceeds it",
+    )
+    ap.add_argument("--resume", action="store_true", help="continue from the journal of an interrupted run")
+    ap.add_argument(
+        "--refresh",
+        action="store_true",
+        help="pets only: refetch just the pages whose CDX digest changed since the last run",
+    )
+    ap.add_argument("--profile", action="store_true", help="run under cProfile + tracemalloc")
+    ap.add_argument(
+        "--profile-sample",
+        type=int,
+        default=0,
+        metavar="N",
+        help="with --profile: only profile every Nth page extraction",
+    )
+    args = ap.parse_args(argv)
+    if args.refresh and args.target != "pets":
+        ap.error("--refresh is only supported for pets")
+    if args.concurrency is not None and args.concurrency < 1:
+        ap.error("--concurrency must be at least 1")
+
+    run, default_output = _TARGETS[args.target]
+    output = args.output or default_output
+    if args.refresh:
+        run = functools.partial(run, refresh=True)
+    if not args.profile:
+        run(output, args.concurrency, args.resume)
+        return
 
+    from profiling import RunProfiler, attach_to_report, print_summary
+
+    _PROFILER = RunProfiler(sample_every=args.profile_sample)
+    _PROFILER.start()
+    try:
+        run(output, args.concurrency, args.resume)
+    finally:
+        report = report_path_for(output)
+        summary = _PROFILER.stop(report[: -len(".report.json")])
+        _PROFILER = None
+        attach_to_report(report, summary)
+        print_summary(summary)
+        print(f"Profile attached to {report}")
 
+
+if __name__ == "__main__":
+    _cli()
+ 
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import CFG
+
+
+# Process-wide crawl telemetry: per-stage latency histograms plus named
+# counters, cheap enough to leave on for every run.
+#
+#   stages:   resolve, fetch, parse, extract, write, compact
+#   counters: http.<endpoint>.<status>, http.retries.<reason>, http.bytes,
+#             resolve.<source>, page_cache.<hit|miss|revalidated>,
+#             failed.<reason>, skipped.<reason>
+#
+# Worker processes (the parse pool) keep their own METRICS; drain() hands the
+# observations back so the parent can merge() them.
+
+# Upper bounds in seconds: 1ms doubling up to ~65s, then overflow.
+_BOUNDS = [0.001 * 2 ** i for i in range(17)]
+
+
+class Histogram:
+    __slots__ = ("counts", "n", "total", "lo", "hi")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.lo: Optional[float] = None
+        self.hi: Optional[float] = None
+
+    def add(self, seconds: float) -> None:
+        i = 0
+        while i < len(_BOUNDS) and seconds > _BOUNDS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.n += 1
+        self.total += seconds
+        self.lo = seconds if self.lo is None else min(self.lo, seconds)
+        self.hi = seconds if self.hi is None else max(self.hi, seconds)
+
+    def merge(self, raw: dict) -> None:
+        for i, c in enumerate(raw["counts"]):
+            self.counts[i] += c
+        self.n += raw["n"]
+        self.total += raw["total"]
+        for attr, pick in (("lo", min), ("hi", max)):
+            v = raw.get(attr)
+            if v is not None:
+                cur = getattr(self, attr)
+                setattr(self, attr, v if cur is None else pick(cur, v))
+
+    def raw(self) -> dict:
+        return {"counts": list(self.counts), "n": self.n, "total": self.total, "lo": self.lo, "hi": self.hi}
+
+    def percentile(self, pct: float) -> Optional[float]:
+        # bucket upper bound holding the pct-th observation (max for overflow)
+        if not self.n:
+            return None
+        rank = pct / 100 * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(_BOUNDS[i], self.hi) if i < len(_BOUNDS) else self.hi
+        return self.hi
+
+    def summary(self) -> dict:
+        buckets = {}
+        for i, c in enumerate(self.counts):
+            if c:
+                buckets[f"<={_BOUNDS[i]:g}s" if i < len(_BOUNDS) else f">{_BOUNDS[-1]:g}s"] = c
+        r = lambda v: round(v, 4) if v is not None else None
+        return {
+            "count": self.n,
+            "total_s": r(self.total),
+            "mean_s": r(self.total / self.n) if self.n else None,
+            "min_s": r(self.lo),
+            "p50_s": r(self.percentile(50)),
+            "p90_s": r(self.percentile(90)),
+            "p99_s": r(self.percentile(99)),
+            "max_s": r(self.hi),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages: Dict[str, Histogram] = {}
+            self.counters: Counter = Counter()
+            self.started = time.time()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            h = self.stages.get(stage)
+            if h is None:
+                h = self.stages[stage] = Histogram()
+            h.add(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+
+    def drain(self) -> dict:
+        # Take and clear everything recorded so far, in merge() form.
+        with self.lock:
+            raw = {
+                "stages": {k: h.raw() for k, h in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+            self.stages = {}
+            self.counters = Counter()
+        return raw
+
+    def merge(self, raw: Optional[dict]) -> None:
+        if not raw:
+            return
+        with self.lock:
+            for stage, h_raw in raw.get("stages", {}).items():
+                h = self.stages.get(stage)
+                if h is None:
+                    h = self.stages[stage] = Histogram()
+                h.merge(h_raw)
+            self.counters.update(raw.get("counters", {}))
+
+    def report(self, **extra) -> dict:
+        with self.lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed_s": round(time.time() - self.started, 3),
+                "stages": {k: h.summary() for k, h in sorted(self.stages.items())},
+                "counters": dict(sorted(self.counters.items())),
+                **extra,
+            }
+
+
+METRICS = Metrics()
+
+
+def report_path_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets.report.json
+    base = output_path[:-5] if output_path.endswith(".json") else output_path
+    return base + ".report.json"
+
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+# Live "label: done/total (rate/s, ETA)" line, printed at most every
+# CFG["PROGRESS_INTERVAL"] seconds and always for the last item. Rate is over
+# this run only, so a resumed crawl's ETA isn't skewed by journaled items.
+class Progress:
+    def __init__(self, label: str, total: int, done: int = 0, interval: Optional[float] = None):
+        self.label = label
+        self.total = total
+        self.done = done
+        self.start_done = done
+        self.interval = CFG.get("PROGRESS_INTERVAL", 2.0) if interval is None else interval
+        self.started = time.monotonic()
+        self.last = 0.0
+
+    def tick(self, n: int = 1) -> None:
+        self.done += n
+        now = time.monotonic()
+        if now - self.last < self.interval and self.done < self.total:
+            return
+        self.last = now
+        elapsed = now - self.started
+        rate = (self.done - self.start_done) / elapsed if elapsed > 0 else 0.0
+        left = self.total - self.done
+        eta = _clock(left / rate) if rate > 0 else "?"
+        print(f"{self.label}: {self.done}/{self.total} ({rate:.2f}/s, ETA {eta})")
+
+
+__all__ = [
+    "METRICS",
+    "Histogram",
+    "Metrics",
+    "Progress",
+    "report_path_for",
+]
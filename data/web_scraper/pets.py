@@ -4,9 +4,12 @@ from urllib.parse import urljoin
 import re
 
 from bs4 import BeautifulSoup
+from lxml import etree
+from cache import ResponseCache, default_cache, fetch_cached
 from config import CFG
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from metrics import METRICS
+from transport import shared_session, timeout_tuple
+from htmlscan import first_ancestor, first_descendant, has_class, next_sibling, only_string, parse_html, text
 import uuid, html, unicodedata
 
 
@@ -20,9 +23,22 @@ def _canon(s: str) -> str:
     s = re.sub(r"\s+", " ", s)
     return s
 
+
+def pet_id_for_name(name: str) -> str:
+    return str(uuid.uuid5(_PET_NS, _canon(name)))
+
+
 class PetScraper:
-    def __init__(self, session: Optional[requests.Session] = None):
-        self.session = session or _make_session()
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        parse_only: bool = False,
+    ):
+        # parse_only: just the extract_* methods (parse workers), no session
+        # and no page cache
+        self.session = None if parse_only else (session or shared_session())
+        self.cache = None if parse_only else (cache if cache is not None else default_cache())
 
     def list_pet_original_urls(self, limit: int = 5000) -> List[str]:
         params = {
@@ -33,7 +49,7 @@ class PetScraper:
             "filter": "statuscode:200",
             "limit": str(limit),
         }
-        r = self.session.get(CFG["CDX"], params=params, timeout=_timeout_tuple())
+        r = self.session.get(CFG["CDX"], params=params, timeout=timeout_tuple())
         r.raise_for_status()
         rows = r.json()
         if not rows or len(rows) <= 1:
@@ -41,15 +57,53 @@ class PetScraper:
         return [row[0] for row in rows[1:] if row]
 
     def build_pet_obj(self, url: str):
-        pet = {}
-
         # fetch and parse
-        timeout = _timeout_tuple(default_read=180)
+        return self.extract_pet_obj(self.fetch_page(url), url)
+
+    def fetch_page(self, url: str) -> bytes:
+        timeout = timeout_tuple(default_read=180)
         headers = {"User-Agent": "Mozilla/5.0 (compatible; PetScraper/1.0)"}
-        resp = self.session.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.content, "lxml")
+        return fetch_cached(self.session, url, self.cache, headers=headers, timeout=timeout, allow_redirects=True)
+
+    def extract_pet_obj(self, content: bytes, url: str) -> dict:
+        # Single pass over the lxml tree; falls back to the soup extractors
+        # if lxml cannot make a document out of the page.
+        try:
+            with METRICS.timer("parse"):
+                root = parse_html(content)
+        except (etree.ParserError, ValueError):
+            return self._extract_pet_obj_soup(content, url)
 
+        with METRICS.timer("extract"):
+            return self._pet_from_scan(_scan_pet_page(root), url)
+
+    def _pet_from_scan(self, found: dict, url: str) -> dict:
+        ts, orig_base = self._extract_snapshot_context(url)
+
+        pet = {}
+        pet_name = found["title"].replace("Pet:", "").replace(" - Wizard101 Wiki", "").strip()
+        pet["ID"] = self._assign_pet_id_from_name(pet_name)
+        pet["name"] = pet_name
+        src = found["icon"]
+        pet["icon"] = self._normalize_image(src, ts, orig_base) if src and ts and orig_base else src
+        pet["school"] = found["school"]
+        pet["description"] = found["description"]
+        pet["abilities"] = found["abilities"]
+        pet["pedigree"] = found["pedigree"]
+        pet["cards"] = found["cards"]
+        pet["sell price"] = found["sell price"]
+        pet["attributes"] = found["attributes"]
+        return pet
+
+    def _extract_pet_obj_soup(self, content: bytes, url: str) -> dict:
+        # Reference extractor: one BeautifulSoup search per field.
+        with METRICS.timer("parse"):
+            soup = BeautifulSoup(content, "lxml")
+        with METRICS.timer("extract"):
+            return self._pet_from_soup(soup, url)
+
+    def _pet_from_soup(self, soup: BeautifulSoup, url: str) -> dict:
+        pet = {}
 
         # derive snapshot context from the URL
         ts, orig_base = self._extract_snapshot_context(url)
@@ -74,7 +128,7 @@ class PetScraper:
 
 
     def _assign_pet_id_from_name(self, name):
-        return str(uuid.uuid5(_PET_NS, _canon(name)))
+        return pet_id_for_name(name)
 
     def _get_pet_name(self, soup):
         title = soup.title.get_text(strip=True) if soup.title else ""
@@ -241,43 +295,124 @@ class PetScraper:
 
         
 
-__all__ = [
-    "PetScraper",
-]
-
-
-# Internal: shared session and timeout handling
-def _make_session(total_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=total_retries,
-        connect=total_retries,
-        read=total_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET", "HEAD"),
-        raise_on_status=False,
-    )
-    s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; PetScraper/1.0)"})
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    return s
+def _ability_title(td) -> Optional[str]:
+    a = first_descendant(td, "a", href=True)
+    img = first_descendant(td, "img")
+    if a is None and img is None:
+        return None
+    return (a.get("title") if a is not None and a.get("title") else None) or \
+           (img.get("alt") if img is not None and img.get("alt") else None) or \
+           (text(a) if a is not None else None)
 
 
-def _timeout_tuple(default_read: int = 120) -> Tuple[int, int]:
-    # Accept CFG["TIMEOUT"] as seconds or (connect, read) tuple
-    t = CFG.get("TIMEOUT", default_read)
-    connect = 10
-    read = default_read
-    if isinstance(t, (list, tuple)) and len(t) == 2:
-        try:
-            connect, read = int(t[0]), int(t[1])
-        except Exception:
-            connect, read = 10, default_read
-    elif isinstance(t, (int, float)):
-        read = int(t)
-    return (connect, read)
+def _scan_abilities(table) -> dict:
+    talents, derby = [], []
+    for tr in table.iterdescendants("tr"):
+        if next(tr.iterdescendants("th"), None) is not None:
+            continue
+        tds = list(tr.iterdescendants("td"))
+        if len(tds) < 2:
+            continue
+        title = _ability_title(tds[0])
+        if title:
+            talents.append(title)
+        title = _ability_title(tds[1])
+        if title:
+            derby.append(title)
+    return {"talents": talents, "derby": derby}
+
+
+def _scan_attributes(table) -> dict:
+    attributes = {}
+    for row in table.iterdescendants("tr"):
+        cells = list(row.iterdescendants("td"))
+        if len(cells) >= 4:
+            attr_name = text(cells[2])
+            attr_value = text(cells[3])
+            if attr_name and attr_value:
+                attributes[attr_name] = attr_value
+    return attributes
+
+
+def _label(el, *needles: str) -> bool:
+    s = only_string(el)
+    return bool(s) and all(n in s for n in needles)
+
+
+def _scan_pet_page(root) -> dict:
+    # One document-order walk collecting every PetScraper field. Each field
+    # keeps the semantics of its _get_* method: the first matching label wins
+    # and "find_next" targets are simply the next matching element the walk
+    # reaches after that label.
+    out = {
+        "title": "", "icon": None, "school": None, "description": None,
+        "abilities": {"talents": [], "derby": []}, "pedigree": None,
+        "cards": [], "sell price": None, "attributes": {},
+    }
+    title_seen = False
+    icon_img = fallback_img = None
+    school = desc = pedigree = cards = "search"
+    sell_seen = abilities_seen = attrs_seen = False
+
+    for el in root.iter():
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue
 
+        # pending "next element after the label" lookups
+        if tag == "td":
+            if school == "value":
+                out["school"] = text(el)
+                school = "done"
+            if pedigree == "value":
+                m = re.search(r"\d+", text(el))
+                out["pedigree"] = int(m.group(0)) if m else None
+                pedigree = "done"
+        elif tag == "p" and desc == "value":
+            out["description"] = text(el)
+            desc = "done"
+        elif tag == "img":
+            if cards == "collect" and has_class(el, "pet-spell-image") and el.get("alt"):
+                out["cards"].append(el.get("alt"))
+            if icon_img is None and any("infobox" in (t.get("class") or "") for t in el.iterancestors("table")):
+                icon_img = el
+            if fallback_img is None and "(Pet)" in (el.get("alt") or ""):
+                fallback_img = el
+
+        # labels and anchors
+        if tag == "title" and not title_seen:
+            title_seen = True
+            out["title"] = text(el)
+        elif tag == "td" and school == "search" and _label(el, "School"):
+            school = "value"
+        elif tag == "b":
+            if pedigree == "search" and _label(el, "Pedigree"):
+                pedigree = "value"
+            if not sell_seen and _label(el, "Sell", "Price"):
+                sell_seen = True
+                cell = first_ancestor(el, "td")
+                nxt = next_sibling(cell, "td") if cell is not None else None
+                out["sell price"] = text(nxt, " ") if nxt is not None else None
+        elif tag == "div":
+            if desc == "search" and has_class(el, "infobox-plain-heading") and _label(el, "Description"):
+                desc = "value"
+            if cards == "search" and (_label(el, "Bonuses") or _label(el, "Item Cards")):
+                cards = "collect"
+        elif tag == "table":
+            if not abilities_seen and has_class(el, "data-table", "ability-list"):
+                abilities_seen = True
+                out["abilities"] = _scan_abilities(el)
+            if not attrs_seen and has_class(el, "data-table", "pet-stats-table"):
+                attrs_seen = True
+                out["attributes"] = _scan_attributes(el)
+
+    # an infobox image without src means no icon, same as _get_icon
+    img = icon_img if icon_img is not None else fallback_img
+    out["icon"] = img.get("src") if img is not None and img.get("src") else None
+    return out
 
-_SESSION = _make_session()
 
+__all__ = [
+    "PetScraper",
+    "pet_id_for_name",
+]
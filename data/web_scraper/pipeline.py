@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+from config import CFG
+from metrics import METRICS
+
+
+T = TypeVar("T")
+
+# What a fetch job hands to the parse stage: (id_url, page bytes, record).
+# With bytes, the page still needs parsing; with content=None, `record` is the
+# final answer (a fallback object, or None for "no capture").
+Fetched = Tuple[Optional[str], Optional[bytes], Optional[dict]]
+
+_DONE = object()
+
+
+# --- parse stage (runs inside worker processes) ---
+
+_EXTRACTORS: Dict[str, Callable[[bytes, str], dict]] = {}
+
+
+def _extractor(kind: str) -> Callable[[bytes, str], dict]:
+    ex = _EXTRACTORS.get(kind)
+    if ex is not None:
+        return ex
+    if kind == "pet":
+        from pets import PetScraper
+        ex = PetScraper(parse_only=True).extract_pet_obj
+    elif kind == "spell":
+        from spells import SpellScraper
+        ex = SpellScraper(parse_only=True).extract_spell_obj
+    elif kind == "ability":
+        from abilities import AbilityScraper
+        ex = AbilityScraper(parse_only=True).extract_ability_obj
+    else:
+        raise ValueError(f"unknown page kind: {kind}")
+    _EXTRACTORS[kind] = ex
+    return ex
+
+
+def extract_page(kind: str, content: bytes, id_url: str) -> Tuple[dict, dict]:
+    # Returns the record plus this worker's parse/extract timings since the
+    # last call, for the parent to merge into its own METRICS.
+    record = _extractor(kind)(content, id_url)
+    return record, METRICS.drain()
+
+
+def parse_workers() -> int:
+    n = CFG.get("PARSE_PROCESSES")
+    if n is None:
+        return os.cpu_count() or 1
+    return max(0, int(n))
+
+
+def parse_pool(parsers: Optional[int] = None) -> ProcessPoolExecutor:
+    # Extractor process pool; pass it to several pipelines to share it (each
+    # job carries its own kind).
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max(1, int(parsers or parse_workers() or 1)), mp_context=ctx)
+
+
+def pipeline(
+    items: Iterable[T],
+    fetch: Callable[[T], Fetched],
+    kind: Union[str, Callable[[T], str]],
+    fetchers: Optional[int] = None,
+    parsers: Optional[int] = None,
+    depth: Optional[int] = None,
+    controller=None,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> Iterator[Tuple[T, Optional[dict], Optional[Exception]]]:
+    # Three decoupled stages with backpressure:
+    #   fetch threads -> bounded queue of raw pages -> process pool of extractors
+    #   -> the caller, which is the writer and sees (item, record, error) in
+    #   input order, exactly like crawl.crawl().
+    # At most `depth` items are anywhere in the pipeline at once, so a slow
+    # writer stalls parsing, a slow parse pool stalls fetching, and memory for
+    # queued pages stays bounded.
+    # With an AIMDController, the controller decides how many of the
+    # `fetchers` threads (at most its maximum) may fetch at once.
+    # `items` is consumed lazily, so it may be a queue that is still filling.
+    # `kind` names the extractor, or is a function giving it per item, so one
+    # pipeline (and one process pool) can serve mixed pets/spells/abilities.
+    # A `pool` from parse_pool() is used as is and left running, so
+    # concurrent pipelines can share one; otherwise each run starts its own.
+    fetchers = max(1, int(fetchers or CFG["CONCURRENCY"]))
+    if controller is not None:
+        fetchers = min(fetchers, controller.maximum)
+    parsers = max(1, int(parsers or parse_workers() or 1))
+    depth = max(fetchers + parsers, int(depth or CFG.get("PIPELINE_DEPTH", 64)))
+
+    slots = threading.BoundedSemaphore(depth)
+    work_q: queue.Queue = queue.Queue()
+    raw_q: queue.Queue = queue.Queue(maxsize=depth)
+    finished: Dict[int, tuple] = {}
+    fed: List[Optional[int]] = [None]
+    cond = threading.Condition()
+    stop = threading.Event()
+
+    def finish(idx, item, record, err):
+        with cond:
+            finished[idx] = (item, record, err)
+            cond.notify_all()
+
+    def feeder():
+        count = 0
+        for item in items:
+            while not slots.acquire(timeout=0.5):
+                if stop.is_set():
+                    break
+            if stop.is_set():
+                break
+            work_q.put((count, item))
+            count += 1
+        with cond:
+            fed[0] = count
+            cond.notify_all()
+        for _ in range(fetchers):
+            work_q.put(_DONE)
+
+    def fetch_worker():
+        while True:
+            job = work_q.get()
+            if job is _DONE:
+                return
+            idx, item = job
+            if controller is not None:
+                controller.acquire()
+            try:
+                id_url, content, record = fetch(item)
+            except Exception as e:
+                finish(idx, item, None, e)
+                continue
+            finally:
+                if controller is not None:
+                    controller.release()
+            if content is None:
+                finish(idx, item, record, None)
+            else:
+                raw_q.put((idx, item, id_url, content))
+
+    def dispatch(executor):
+        while True:
+            job = raw_q.get()
+            if job is _DONE:
+                return
+            idx, item, id_url, content = job
+
+            def done(fut, idx=idx, item=item):
+                try:
+                    record, worker_metrics = fut.result()
+                except Exception as e:
+                    finish(idx, item, None, e)
+                    return
+                METRICS.merge(worker_metrics)
+                finish(idx, item, record, None)
+
+            try:
+                page_kind = kind(item) if callable(kind) else kind
+                executor.submit(extract_page, page_kind, content, id_url).add_done_callback(done)
+            except Exception as e:
+                finish(idx, item, None, e)
+
+    def parse_dispatcher():
+        if pool is not None:
+            dispatch(pool)
+            return
+        with parse_pool(parsers) as own:
+            dispatch(own)
+
+    def close_raw(threads):
+        for t in threads:
+            t.join()
+        raw_q.put(_DONE)
+
+    fetch_threads = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(fetchers)]
+    background = [threading.Thread(target=feeder, daemon=True)] + fetch_threads + [
+        threading.Thread(target=close_raw, args=(fetch_threads,), daemon=True),
+        threading.Thread(target=parse_dispatcher, daemon=True),
+    ]
+    for t in background:
+        t.start()
+
+    try:
+        idx = 0
+        while True:
+            with cond:
+                while idx not in finished and (fed[0] is None or idx < fed[0]):
+                    cond.wait()
+                if idx not in finished:
+                    return
+                item, record, err = finished.pop(idx)
+            slots.release()
+            yield item, record, err
+            idx += 1
+    finally:
+        stop.set()
+
+
+__all__ = [
+    "extract_page",
+    "parse_pool",
+    "parse_workers",
+    "pipeline",
+]
@@ -0,0 +1,207 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from typing import Callable, Optional
+
+from journal import atomic_write_json
+
+
+# Profiling mode for scraper runs (python main.py <target> --profile ...).
+#
+# Full mode profiles every thread the run starts (crawl workers included) and
+# tracks allocations with tracemalloc. Sampled mode leaves fetching alone and
+# profiles only every Nth page extraction, which keeps the overhead off the
+# network side and makes runs over the same pages comparable.
+#
+# Results land next to the run report: <output>.prof (pstats, loadable with
+# snakeviz / pstats.Stats), <output>.profile.txt (sorted text dump), and a
+# "profile" section merged into <output>.report.json.
+
+# Functions we care about by name: the extractors, ID canonicalisation and the
+# snapshot-URL regex work.
+FOCUS_RE = re.compile(
+    r"(_get_\w+|_canon|_extract_snapshot_context|_normalize_image|_scan_\w+|_\w+_from_(scan|soup)|"
+    r"extract_\w+_obj|parse_html)$"
+)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_REGEX_FUNCS = re.compile(r"re\.Pattern|_sre|^(search|match|sub|fullmatch|findall|compile)$")
+
+
+def _func_label(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _is_regex(func: tuple) -> bool:
+    filename, _, name = func
+    return bool(_REGEX_FUNCS.search(name)) and (filename == "~" or filename.endswith(os.path.join("re", "__init__.py")))
+
+
+def _row(func: tuple, stat: tuple) -> dict:
+    cc, nc, tt, ct, _ = stat
+    return {
+        "function": _func_label(func),
+        "calls": nc,
+        "tottime_s": round(tt, 6),
+        "cumtime_s": round(ct, 6),
+        "per_call_us": round(tt / nc * 1e6, 2) if nc else None,
+    }
+
+
+class RunProfiler:
+    def __init__(self, sample_every: int = 0, top: int = 30, trace_frames: int = 8):
+        self.sample_every = max(0, int(sample_every))
+        self.top = top
+        self.trace_frames = trace_frames
+        self.lock = threading.Lock()
+        self.profiles: list = []
+        self.calls = 0
+        self.sampled = 0
+        self.main: Optional[cProfile.Profile] = None
+
+    @property
+    def sampling(self) -> bool:
+        return self.sample_every > 0
+
+    def start(self) -> None:
+        tracemalloc.start(self.trace_frames)
+        if self.sampling:
+            return
+        self.main = cProfile.Profile()
+        # every thread started from here on gets its own profiler
+        threading.setprofile(self._thread_bootstrap)
+        self.main.enable()
+
+    def _thread_bootstrap(self, frame, event, arg):
+        sys.setprofile(None)
+        prof = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(prof)
+        prof.enable()
+
+    def wrap(self, extract: Callable) -> Callable:
+        # Sampled mode: run every Nth extraction under its own profiler.
+        if not self.sampling:
+            return extract
+
+        def sampled(content, url):
+            with self.lock:
+                self.calls += 1
+                take = (self.calls - 1) % self.sample_every == 0
+            if not take:
+                return extract(content, url)
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(extract, content, url)
+            finally:
+                with self.lock:
+                    self.profiles.append(prof)
+                    self.sampled += 1
+
+        return sampled
+
+    def stop(self, base_path: str) -> dict:
+        # Stop profiling, write <base>.prof / <base>.profile.txt, return the
+        # summary that goes into the run report.
+        if self.main is not None:
+            self.main.disable()
+            threading.setprofile(None)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        tracemalloc.stop()
+
+        with self.lock:
+            profiles = ([self.main] if self.main is not None else []) + list(self.profiles)
+        stats = None
+        for prof in profiles:
+            try:
+                stats = pstats.Stats(prof) if stats is None else stats.add(prof)
+            except TypeError:
+                # profiler that never saw a call (thread exited immediately)
+                continue
+
+        summary = {
+            "mode": "sampled" if self.sampling else "full",
+            "threads_profiled": len(profiles),
+        }
+        if self.sampling:
+            summary.update(sample_every=self.sample_every, pages_seen=self.calls, pages_profiled=self.sampled)
+
+        if stats is not None:
+            prof_path = base_path + ".prof"
+            stats.dump_stats(prof_path)
+            text = io.StringIO()
+            pstats.Stats(prof_path, stream=text).sort_stats("tottime").print_stats(80)
+            with open(base_path + ".profile.txt", "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            summary["profile_files"] = [prof_path, base_path + ".profile.txt"]
+
+            rows = stats.stats
+            summary["total_time_s"] = round(stats.total_tt, 4)
+            summary["hot_spots"] = [
+                _row(func, rows[func]) for func in sorted(rows, key=lambda f: rows[f][2], reverse=True)[: self.top]
+            ]
+            summary["focus"] = [
+                _row(func, rows[func])
+                for func in sorted(rows, key=lambda f: rows[f][3], reverse=True)
+                if FOCUS_RE.search(func[2]) and os.path.dirname(os.path.abspath(func[0])) == _HERE
+            ]
+            summary["regex"] = [
+                _row(func, rows[func])
+                for func in sorted(rows, key=lambda f: rows[f][2], reverse=True)
+                if _is_regex(func)
+            ][: self.top]
+
+        summary["memory"] = {
+            "current_kb": current // 1024,
+            "peak_kb": peak // 1024,
+            "top_allocations": [
+                {
+                    "where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                    "size_kb": round(s.size / 1024, 1),
+                    "blocks": s.count,
+                }
+                for s in snapshot.statistics("lineno")[: self.top]
+            ],
+        }
+        return summary
+
+
+def attach_to_report(report_path: str, summary: dict) -> None:
+    # Merge the profile summary into an existing run report (or start one).
+    report = {}
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f) or {}
+    except (OSError, ValueError):
+        pass
+    report["profile"] = summary
+    atomic_write_json(report_path, report)
+
+
+def print_summary(summary: dict, limit: int = 15) -> None:
+    print(f"Profile ({summary['mode']}, {summary.get('total_time_s', 0)}s profiled):")
+    for r in summary.get("focus", [])[:limit]:
+        print(f"  {r['cumtime_s']:>9.4f}s cum {r['tottime_s']:>9.4f}s own {r['calls']:>8} calls  {r['function']}")
+    mem = summary.get("memory", {})
+    print(f"  memory: peak {mem.get('peak_kb')} KB, current {mem.get('current_kb')} KB")
+
+
+__all__ = [
+    "FOCUS_RE",
+    "RunProfiler",
+    "attach_to_report",
+    "print_summary",
+]
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from columns import ATTRIBUTES, PetTable, as_float
+from journal import atomic_write_json
+
+
+# Vectorized version of the Insights page scoring (src/app/home/Insights):
+# SchoolBestPets.tsx's per-pet Cards/Talents/Derby/Pedigree/Attributes scores
+# and per-school averages, and petoftheday.tsx's per-school pedigree mean,
+# standard deviation and percentile.
+#
+# The scraper output is turned into one pets x components matrix (NaN where a
+# component is missing); any number of weight vectors are then scored with a
+# single matrix product. Because a school's average score is linear in the
+# weights, the aggregates file stores per-school component means and the site
+# can rank schools for any slider position with a 5-term dot product.
+#
+#   python scoring.py                       # ../pets.json + ../abilities.json -> ../aggregates.json
+
+COMPONENTS = ("cards", "talents", "derby", "pedigree", "attributes")
+DEFAULT_WEIGHTS = {"cards": 0.3, "talents": 0.3, "derby": 0.1, "pedigree": 0.2, "attributes": 0.1}
+
+RARITY_PCT = {"common": 20, "uncommon": 40, "rare": 60, "ultra-rare": 80, "epic": 100}
+ATTRIBUTE_MAX = {"Strength": 255, "Intellect": 250, "Agility": 260, "Will": 260, "Power": 250}
+NEUTRAL = 50.0
+# schools left out of the ranking chart
+SKIP_SCHOOLS = {"unknown", "unk", "n/a", "na", "none", "(unknown)"}
+# ATTRIBUTE_MAX in the column table's attribute order
+_ATTRIBUTE_MAXES = np.array([ATTRIBUTE_MAX[a] for a in ATTRIBUTES], dtype=float)
+
+
+def rarity_map(abilities: List[dict]) -> Dict[str, float]:
+    out = {}
+    for a in abilities or []:
+        name = str(a.get("name") or "").lower()
+        pct = RARITY_PCT.get(str(a.get("rarity") or "").lower())
+        if name and pct is not None:
+            out[name] = float(pct)
+    return out
+
+
+class PetMatrix:
+    # Raw per-pet features. Numeric fields come from the typed column table
+    # (columns.PetTable, built from `pets` unless passed in); only the name
+    # lists are read per record:
+    #   n_cards (N,), pedigree (N,) as Number(pedigree) (NaN if not finite),
+    #   talent/derby rarity sums and counts (N,), attribute values (N, 5).
+    def __init__(self, pets: List[dict], rarity: Dict[str, float], table: Optional[PetTable] = None):
+        table = PetTable.from_pets(pets) if table is None else table
+        n = len(table)
+        self.ids = table.ids.tolist()
+        self.names = table.names.tolist()
+        self.schools = table.schools()
+        self.n_cards = np.array([len(p.get("cards")) if isinstance(p.get("cards"), list) else 0 for p in pets], dtype=float)
+        # Number(p.pedigree): a null pedigree scores 0 on the page, a missing
+        # or non-numeric one is neutral
+        self.pedigree_raw = as_float(table.pedigree)
+        self.pedigree = np.where(table.pedigree_null, 0.0, self.pedigree_raw)
+        self.attrs = as_float(table.attributes)
+
+        self.rarity_sum = np.zeros((n, 2))
+        self.rarity_n = np.zeros((n, 2))
+        for i, p in enumerate(pets):
+            abilities = p.get("abilities") or {}
+            for j, key in enumerate(("talents", "derby")):
+                names = abilities.get(key)
+                for name in names if isinstance(names, list) else []:
+                    pct = rarity.get(str(name).lower())
+                    if pct is not None:
+                        self.rarity_sum[i, j] += pct
+                        self.rarity_n[i, j] += 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def components(self) -> np.ndarray:
+        # (N, 5) component scores on 0..100, NaN where the pet has no data
+        c = self.n_cards.clip(min=0)
+        mid = 1.3
+        cards = np.where(c >= 3, 100.0, np.where(c <= mid, c / mid * 50, 50 + (c - mid) / (3 - mid) * 50))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rarity = np.where(self.rarity_n > 0, self.rarity_sum / self.rarity_n, np.nan)
+            scaled = np.clip(self.attrs / _ATTRIBUTE_MAXES * 100, 0, 100)
+            finite = np.isfinite(self.attrs)
+            n_attr = finite.sum(axis=1)
+            attributes = np.where(n_attr > 0, np.where(finite, scaled, 0).sum(axis=1) / n_attr, np.nan)
+
+        pedigree = np.where(np.isfinite(self.pedigree), np.clip(self.pedigree, 0, 100), np.nan)
+        return np.column_stack([cards, rarity[:, 0], rarity[:, 1], pedigree, attributes])
+
+
+def normalize_weights(weights) -> np.ndarray:
+    # (K, 5) rows summing to 1; accepts a dict, a 5-vector or a (K, 5) batch.
+    if isinstance(weights, dict):
+        weights = [weights.get(k, 0.0) for k in COMPONENTS]
+    w = np.atleast_2d(np.asarray(weights, dtype=float))
+    if w.shape[1] != len(COMPONENTS):
+        raise ValueError(f"weights need {len(COMPONENTS)} columns ({', '.join(COMPONENTS)}), got {w.shape[1]}")
+    total = w.sum(axis=1, keepdims=True)
+    return w / np.where(total > 0, total, 1.0)
+
+
+def weighted_scores(components: np.ndarray, weights) -> np.ndarray:
+    # (N, K): every pet scored under every weight vector; missing -> neutral 50
+    return np.nan_to_num(components, nan=NEUTRAL) @ normalize_weights(weights).T
+
+
+def _school_groups(schools: Sequence[str], skip: bool) -> tuple[List[str], np.ndarray]:
+    # School labels in first-seen order and an (N,) group index (-1 = left out)
+    labels, index = [], {}
+    groups = np.full(len(schools), -1)
+    for i, s in enumerate(schools):
+        key = (s or "").strip() if skip else s
+        if skip and (not key or key.lower() in SKIP_SCHOOLS):
+            continue
+        if key not in index:
+            index[key] = len(labels)
+            labels.append(key)
+        groups[i] = index[key]
+    return labels, groups
+
+
+def _one_hot(groups: np.ndarray, n_groups: int) -> np.ndarray:
+    m = np.zeros((n_groups, len(groups)))
+    keep = groups >= 0
+    m[groups[keep], np.nonzero(keep)[0]] = 1.0
+    return m
+
+
+def school_component_means(matrix: PetMatrix, components: Optional[np.ndarray] = None) -> tuple[List[str], np.ndarray, np.ndarray]:
+    # (schools, (S, 5) means of neutral-filled components, (S,) pet counts)
+    comps = matrix.components() if components is None else components
+    labels, groups = _school_groups(matrix.schools, skip=True)
+    onehot = _one_hot(groups, len(labels))
+    counts = onehot.sum(axis=1)
+    means = onehot @ np.nan_to_num(comps, nan=NEUTRAL) / np.maximum(counts, 1)[:, None]
+    return labels, means, counts
+
+
+def school_scores(matrix: PetMatrix, weights) -> tuple[List[str], np.ndarray]:
+    # (schools, (S, K)) average weighted score per school per weight vector
+    labels, means, _ = school_component_means(matrix)
+    return labels, means @ normalize_weights(weights).T
+
+
+def pedigree_stats(matrix: PetMatrix) -> tuple[Dict[str, dict], np.ndarray]:
+    # Per-school pedigree mean / population std dev, and each pet's percentile
+    # (share of same-school pedigrees <= its own, rounded like Math.round).
+    labels, groups = _school_groups(matrix.schools, skip=False)
+    ped = matrix.pedigree_raw
+    pct = np.full(len(matrix), np.nan)
+    stats = {}
+    for g, label in enumerate(labels):
+        members = np.nonzero(groups == g)[0]
+        vals = ped[members]
+        has = np.isfinite(vals)
+        vals_ok = np.sort(vals[has])
+        if not len(vals_ok):
+            continue
+        stats[label] = {"n": int(len(vals_ok)), "mean": float(vals_ok.mean()), "std": float(vals_ok.std())}
+        below = np.searchsorted(vals_ok, vals[has], side="right")
+        pct[members[has]] = np.clip(np.floor(below / len(vals_ok) * 100 + 0.5), 0, 100)
+    return stats, pct
+
+
+def score_percentiles(scores: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    # (N,) share of same-group scores <= each pet's score, 0..100
+    out = np.full(len(scores), np.nan)
+    for g in np.unique(groups[groups >= 0]):
+        members = np.nonzero(groups == g)[0]
+        ordered = np.sort(scores[members])
+        out[members] = np.searchsorted(ordered, scores[members], side="right") / len(ordered) * 100
+    return out
+
+
+def _col(values: np.ndarray, digits: int = 3) -> list:
+    return [None if not np.isfinite(v) else round(float(v), digits) for v in values]
+
+
+def build_aggregates(pets: List[dict], abilities: List[dict], weights=None) -> dict:
+    rarity = rarity_map(abilities)
+    matrix = PetMatrix(pets, rarity)
+    comps = matrix.components()
+    w = normalize_weights(DEFAULT_WEIGHTS if weights is None else weights)
+    default = weighted_scores(comps, w)[:, 0]
+
+    labels, means, counts = school_component_means(matrix, comps)
+    _, groups = _school_groups(matrix.schools, skip=True)
+    school_default = means @ w[0]
+    order = sorted(range(len(labels)), key=lambda s: (-school_default[s], labels[s]))
+    ped_stats, ped_pct = pedigree_stats(matrix)
+
+    return {
+        "version": 1,
+        "components": list(COMPONENTS),
+        "default_weights": dict(zip(COMPONENTS, (round(float(x), 6) for x in w[0]))),
+        "neutral": NEUTRAL,
+        "rarity_pct": RARITY_PCT,
+        "schools": [
+            {
+                "school": labels[s],
+                "n": int(counts[s]),
+                # average weighted score for weights w = dot(component_means, w / sum(w))
+                "component_means": dict(zip(COMPONENTS, (round(float(x), 4) for x in means[s]))),
+                "score": round(float(school_default[s]), 4),
+                "pedigree": ped_stats.get(labels[s]),
+            }
+            for s in order
+        ],
+        "pedigree_by_school": {k: {**v, "mean": round(v["mean"], 4), "std": round(v["std"], 4)} for k, v in ped_stats.items()},
+        # column arrays, one entry per pet in pets.json order
+        "pets": {
+            "ID": matrix.ids,
+            "school": matrix.schools,
+            **{name: _col(comps[:, j]) for j, name in enumerate(COMPONENTS)},
+            "score": _col(default),
+            "score_percentile": _col(score_percentiles(default, groups), 1),
+            "pedigree_percentile": [None if not np.isfinite(v) else int(v) for v in ped_pct],
+        },
+    }
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = os.path.join(here, "..")
+    ap = argparse.ArgumentParser(description="Precompute Insights scores and per-school aggregates")
+    ap.add_argument("--pets", default=os.path.join(data, "pets.json"))
+    ap.add_argument("--abilities", default=os.path.join(data, "abilities.json"))
+    ap.add_argument("-o", "--output", default=os.path.join(data, "aggregates.json"))
+    args = ap.parse_args(argv)
+
+    with open(args.pets, "r", encoding="utf-8") as f:
+        pets = json.load(f)
+    with open(args.abilities, "r", encoding="utf-8") as f:
+        abilities = json.load(f)
+    agg = build_aggregates(pets, abilities)
+    atomic_write_json(args.output, agg, indent=None, separators=(",", ":"))
+    print(f"Wrote aggregates for {len(pets)} pets / {len(agg['schools'])} schools to {args.output}")
+    for s in agg["schools"]:
+        print(f"  {s['school']:<8} n={s['n']:<4} score={s['score']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import List, Optional
+
+from journal import atomic_write_json
+from pets import _canon
+
+
+# Prebuilt typeahead index over pet, spell and ability names.
+#
+# Names are normalized with pets._canon (HTML-unescape, NFKC, lowercase,
+# collapsed whitespace), the same normalization the pet IDs are built from.
+# Two posting maps point at document numbers:
+#   "prefix":  the 1- and 2-character prefixes of the whole name and of every
+#              word in it, for 1-2 character queries
+#   "trigram": every 3-character window of the whole name, for substring
+#              queries of 3+ characters (intersect the query's trigrams, then
+#              confirm the candidate contains the query)
+# so a lookup touches only the shortest posting list involved, not every name.
+#
+# Documents are numbered in static rank order (pets, then spells, then
+# abilities; more popular first; shorter names first), so posting lists are
+# already ranked and a short query can stop after a few pages of hits per
+# kind. At query time: exact > whole-name prefix > word prefix > substring,
+# then static rank with the kinds interleaved (so pets, listed first, don't
+# hide every spell and ability).
+#
+#   {"version": 1, "kinds": ["pet", "spell", "ability"],
+#    "docs": [[kind, name, ref, hint], ...],   ref = pet ID / null, hint = popularity
+#    "prefix": {key: [doc, ...]}, "trigram": {key: [doc, ...]}}
+
+KINDS = ("pet", "spell", "ability")
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def normalize(s: str) -> str:
+    return _canon(s)
+
+
+def _trigrams(s: str) -> set:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _popularity(pets: List[dict]) -> tuple[Counter, Counter]:
+    # how many pets carry each card / ability, the ranking hint for those docs
+    cards, abilities = Counter(), Counter()
+    for p in pets:
+        cards.update({_canon(c) for c in p.get("cards") or []})
+        ab = p.get("abilities") or {}
+        abilities.update({_canon(a) for a in (ab.get("talents") or []) + (ab.get("derby") or [])})
+    return cards, abilities
+
+
+def build_index(pets: List[dict], spells: List[dict], abilities: List[dict]) -> dict:
+    card_pop, ability_pop = _popularity(pets)
+
+    entries = []
+    seen = set()
+    for kind, items in ((0, pets), (1, spells), (2, abilities)):
+        for item in items or []:
+            name = str(item.get("name") or "").strip()
+            key = _canon(name)
+            if not key or (kind, key) in seen:
+                continue
+            seen.add((kind, key))
+            if kind == 0:
+                ref, hint = item.get("ID"), item.get("pedigree") if isinstance(item.get("pedigree"), int) else 0
+            elif kind == 1:
+                ref, hint = None, card_pop[key]
+            else:
+                ref, hint = None, ability_pop[key]
+            entries.append((kind, -hint, len(key), key, name, ref, hint))
+    entries.sort()
+
+    docs, prefix, trigram = [], {}, {}
+    for doc, (kind, _, _, key, name, ref, hint) in enumerate(entries):
+        docs.append([kind, name, ref, hint])
+        keys = set()
+        for word in [key] + _WORD_RE.findall(key):
+            for n in range(1, min(len(word), 2) + 1):
+                keys.add(word[:n])
+        # sorted, so key order in the file doesn't depend on set hashing
+        for k in sorted(keys):
+            prefix.setdefault(k, []).append(doc)
+        for g in sorted(_trigrams(key)):
+            trigram.setdefault(g, []).append(doc)
+
+    return {
+        "version": 1,
+        "kinds": list(KINDS),
+        "docs": docs,
+        "prefix": prefix,
+        "trigram": trigram,
+    }
+
+
+def _intersect(lists: List[list]) -> List[int]:
+    lists = sorted(lists, key=len)
+    out = lists[0]
+    for other in lists[1:]:
+        s = set(other)
+        out = [d for d in out if d in s]
+        if not out:
+            break
+    return out
+
+
+def search(index: dict, query: str, limit: int = 10, kinds: Optional[List[str]] = None) -> List[dict]:
+    q = normalize(query)
+    if not q:
+        return []
+    docs = index["docs"]
+    allowed = {index["kinds"].index(k) for k in kinds} if kinds else None
+
+    if len(q) < 3:
+        candidates = index["prefix"].get(q, [])
+    else:
+        grams = _trigrams(q)
+        lists = [index["trigram"].get(g) for g in grams]
+        if any(l is None for l in lists):
+            return []
+        candidates = _intersect(lists)
+
+    # posting lists are in doc order, i.e. grouped by kind: walk each kind's
+    # slice on its own so one kind's hits can't crowd out the others
+    hits = []
+    for k in range(len(index["kinds"])):
+        if allowed is not None and k not in allowed:
+            continue
+        lo = bisect_left(candidates, bisect_left(docs, k, key=_doc_kind))
+        hi = bisect_left(candidates, bisect_left(docs, k + 1, key=_doc_kind))
+        found = 0
+        for doc in candidates[lo:hi]:
+            key = normalize(docs[doc][1])
+            if q not in key:
+                continue
+            if key == q:
+                cls = 0
+            elif key.startswith(q):
+                cls = 1
+            elif any(w.startswith(q) for w in _WORD_RE.findall(key)):
+                cls = 2
+            else:
+                cls = 3
+            hits.append((cls, k, doc))
+            found += 1
+            # short queries walk long posting lists; they are in static rank
+            # order, so a few pages of hits per kind is enough to fill the top
+            # `limit`
+            if found >= limit * 4 and len(q) < 3:
+                break
+
+    # within a match class, interleave the kinds by their static rank (best
+    # pet, best spell, best ability, second pet, ...)
+    ranked = []
+    seen = Counter()
+    for cls, k, doc in sorted(hits):
+        ranked.append((cls, seen[cls, k], k, doc))
+        seen[cls, k] += 1
+    ranked.sort()
+    return [
+        {"kind": index["kinds"][docs[d][0]], "name": docs[d][1], "ref": docs[d][2], "hint": docs[d][3]}
+        for _, _, _, d in ranked[:limit]
+    ]
+
+
+def _doc_kind(doc: list) -> int:
+    return doc[0]
+
+
+def main(argv=None) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = os.path.join(here, "..")
+    ap = argparse.ArgumentParser(description="Build the typeahead search index over pet, spell and ability names")
+    ap.add_argument("--pets", default=os.path.join(data, "pets.json"))
+    ap.add_argument("--spells", default=os.path.join(data, "spells.json"))
+    ap.add_argument("--abilities", default=os.path.join(data, "abilities.json"))
+    ap.add_argument("-o", "--output", default=os.path.join(data, "search_index.json"))
+    ap.add_argument("-q", "--query", action="append", help="run these queries against the built index and exit")
+    args = ap.parse_args(argv)
+
+    loaded = []
+    for path in (args.pets, args.spells, args.abilities):
+        with open(path, "r", encoding="utf-8") as f:
+            loaded.append(json.load(f))
+    index = build_index(*loaded)
+
+    if args.query:
+        for q in args.query:
+            t = time.perf_counter()
+            hits = search(index, q)
+            ms = (time.perf_counter() - t) * 1000
+            print(f"{q!r} ({ms:.3f} ms): " + ", ".join(f"{h['name']} [{h['kind']}]" for h in hits))
+        return 0
+
+    atomic_write_json(args.output, index, indent=None, separators=(",", ":"))
+    print(
+        f"Wrote search index to {args.output}: {len(index['docs'])} names, "
+        f"{len(index['prefix'])} prefix keys, {len(index['trigram'])} trigrams, {os.path.getsize(args.output)} B"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
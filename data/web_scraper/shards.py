@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+from config import CFG
+from journal import atomic_write_json
+
+
+# Sharded export of pets.json for clients that only need a list of names up
+# front and one full record on demand:
+#
+#   <dir>/manifest.json     {"version": 1, "count": N, "duplicates": D,
+#                            "fields": ["ID", "name", "school", "pedigree", "shard"],
+#                            "pets": [[ID, name, school, pedigree, shard_index], ...],
+#                            "shards": ["3f.1a2b3c4d5e6f.json", ...]}
+#   <dir>/<prefix>.<hash>.json   {ID: full pet record, ...}
+#
+# Pets are bucketed by the first SHARD_PREFIX_LEN hex digits of their UUID5 ID
+# (pet_id_for_name), so a pet always lands in the same bucket and shards stay
+# a few records each however many pets there are: 2 digits = 256 buckets.
+# Shard names carry a hash of their contents, so they can be cached forever;
+# re-exporting only renames the buckets whose pets changed. Shards are written
+# before the manifest that points at them, and shards no longer referenced
+# are removed afterwards.
+#
+# A name captured under two URLs maps to one ID; the first record wins and
+# the rest are counted in the manifest's "duplicates".
+
+_SHARD_RE = re.compile(r"^[0-9a-f]+\.[0-9a-f]{12}\.json$")
+MANIFEST_FIELDS = ("ID", "name", "school", "pedigree", "shard")
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=False).encode("utf-8")
+
+
+def _with_id(pet: dict) -> dict:
+    if pet.get("ID"):
+        return pet
+    from pets import pet_id_for_name
+    return {"ID": pet_id_for_name(pet.get("name") or ""), **pet}
+
+
+def export_shards(pets: List[dict], out_dir: str, prefix_len: Optional[int] = None) -> dict:
+    prefix_len = int(prefix_len or CFG.get("SHARD_PREFIX_LEN", 2))
+    os.makedirs(out_dir, exist_ok=True)
+
+    buckets: Dict[str, Dict[str, dict]] = {}
+    rows = []
+    duplicates = 0
+    for pet in pets:
+        pet = _with_id(pet)
+        pid = pet["ID"]
+        bucket = pid.replace("-", "")[:prefix_len].lower()
+        shard = buckets.setdefault(bucket, {})
+        if pid in shard:
+            duplicates += 1
+            continue
+        shard[pid] = pet
+        rows.append((pid, pet.get("name"), pet.get("school"), pet.get("pedigree"), bucket))
+
+    names = {}
+    for bucket in sorted(buckets):
+        records = dict(sorted(buckets[bucket].items()))
+        body = _dumps(records)
+        name = f"{bucket}.{hashlib.sha256(body).hexdigest()[:12]}.json"
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        names[bucket] = name
+
+    shard_list = [names[b] for b in sorted(names)]
+    index = {name: i for i, name in enumerate(shard_list)}
+    manifest = {
+        "version": 1,
+        "count": len(rows),
+        "duplicates": duplicates,
+        "fields": list(MANIFEST_FIELDS),
+        "pets": [[pid, name, school, pedigree, index[names[bucket]]] for pid, name, school, pedigree, bucket in rows],
+        "shards": shard_list,
+    }
+    atomic_write_json(os.path.join(out_dir, "manifest.json"), manifest, indent=None, separators=(",", ":"))
+
+    live = set(shard_list)
+    for entry in os.listdir(out_dir):
+        if _SHARD_RE.match(entry) and entry not in live:
+            try:
+                os.remove(os.path.join(out_dir, entry))
+            except OSError:
+                pass
+    return manifest
+
+
+def load_manifest(out_dir: str) -> dict:
+    with open(os.path.join(out_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_pet(out_dir: str, pet_id: str, manifest: Optional[dict] = None) -> Optional[dict]:
+    manifest = manifest or load_manifest(out_dir)
+    for row in manifest["pets"]:
+        if row[0] == pet_id:
+            with open(os.path.join(out_dir, manifest["shards"][row[4]]), "r", encoding="utf-8") as f:
+                return json.load(f).get(pet_id)
+    return None
+
+
+def verify(pets: List[dict], out_dir: str) -> List[str]:
+    # Differences between pets.json and the sharded export (empty = identical).
+    problems = []
+    manifest = load_manifest(out_dir)
+    by_id = {}
+    for name in manifest["shards"]:
+        with open(os.path.join(out_dir, name), "rb") as f:
+            body = f.read()
+        if not name.split(".")[1] == hashlib.sha256(body).hexdigest()[:12]:
+            problems.append(f"shard {name}: content hash mismatch")
+        by_id.update(json.loads(body))
+    firsts, seen = [], set()
+    for pet in map(_with_id, pets):
+        if pet["ID"] not in seen:
+            seen.add(pet["ID"])
+            firsts.append(pet)
+    if manifest["count"] != len(firsts):
+        problems.append(f"count: manifest {manifest['count']}, unique pets {len(firsts)}")
+    for row, pet in zip(manifest["pets"], firsts):
+        if row[0] != pet["ID"] or row[1:4] != [pet.get("name"), pet.get("school"), pet.get("pedigree")]:
+            problems.append(f"manifest row {row[0]}: {row[1:4]} != {pet.get('name')!r}")
+        if by_id.get(pet["ID"]) != pet:
+            problems.append(f"pet {pet['ID']} ({pet.get('name')!r}): shard record differs")
+    return problems
+
+
+def shard_dir_for(output_path: str) -> str:
+    # ./data/pets.json -> ./data/pets/
+    base = output_path[:-5] if output_path.endswith(".json") else output_path
+    return base
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Export pets.json as a manifest plus content-hashed detail shards")
+    ap.add_argument("pets", nargs="?", default="./data/pets.json")
+    ap.add_argument("-o", "--output", help="shard directory (default: <pets> without .json)")
+    ap.add_argument("--prefix-len", type=int, default=None, help="hex digits of the ID used as bucket (default SHARD_PREFIX_LEN)")
+    args = ap.parse_args(argv)
+
+    with open(args.pets, "r", encoding="utf-8") as f:
+        pets = json.load(f)
+    out = args.output or shard_dir_for(args.pets)
+    manifest = export_shards(pets, out, args.prefix_len)
+    problems = verify(pets, out)
+    for p in problems[:20]:
+        print(p)
+    sizes = [os.path.getsize(os.path.join(out, n)) for n in manifest["shards"]]
+    print(
+        f"Wrote {manifest['count']} pets ({manifest['duplicates']} duplicate IDs dropped) to {out}: manifest {os.path.getsize(os.path.join(out, 'manifest.json'))} B, "
+        f"{len(sizes)} shards (max {max(sizes, default=0)} B, mean {sum(sizes) // max(1, len(sizes))} B)"
+    )
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import html
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+import requests
+
+from config import CFG
+
+
+# One CDX row as returned with fl=original,timestamp,statuscode,digest
+Capture = Tuple[str, str, str, str]
+
+
+def url_key(original: str) -> str:
+    # Scheme-less, percent-decoded, lowercased form of a wiki URL, close to the
+    # CDX urlkey so ItemCard:Foo%27s and https/http variants land together.
+    u = original.strip()
+    for prefix in ("https://", "http://"):
+        if u.lower().startswith(prefix):
+            u = u[len(prefix):]
+            break
+    host, _, rest = u.partition("/")
+    host = host.lower().split(":", 1)[0]
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}/{unquote(rest)}".lower()
+
+
+_QUOTES_RE = re.compile(r"['\u2018\u2019`]")
+_PUNCT_RE = re.compile(r"[^\w\s]+|_")
+
+
+def fold_title(title: str, loose: bool = False) -> str:
+    # Comparison key for a wiki title, whether it comes from pets.json
+    # ("Move It!") or a URL ("Move_It%21"): pets._canon folding with
+    # underscores as spaces. `loose` also drops apostrophes and turns any
+    # other punctuation into a space, so "Death-Ward" matches "Death Ward".
+    t = unicodedata.normalize("NFKC", html.unescape(unquote(title or ""))).replace("_", " ")
+    if loose:
+        t = _PUNCT_RE.sub(" ", _QUOTES_RE.sub("", t))
+    return " ".join(t.lower().split())
+
+
+def _title_of(key: str, namespace: str) -> Optional[str]:
+    # "wiki.example.com/wiki/petability:move it!" -> "move it!"
+    _, _, page = key.partition("/wiki/")
+    prefix = namespace.lower() + ":"
+    return page[len(prefix):] if page.startswith(prefix) else None
+
+
+def list_namespace_captures(
+    session: requests.Session,
+    namespace: str,
+    page_size: Optional[int] = None,
+) -> Iterator[Capture]:
+    # Stream every capture under wiki/<namespace>:* using CDX resume keys, one
+    # paged request per `page_size` rows instead of one lookup per title.
+    page_size = page_size or CFG.get("CDX_PAGE_SIZE", 5000)
+    params = {
+        "url": f"{CFG['DOMAIN']}/wiki/{namespace}:*",
+        "output": "json",
+        "fl": "original,timestamp,statuscode,digest",
+        "collapse": "digest",
+        "limit": str(page_size),
+        "showResumeKey": "true",
+    }
+    resume = None
+    while True:
+        if resume:
+            params["resumeKey"] = resume
+        r = session.get(CFG["CDX"], params=params, timeout=CFG["TIMEOUT"])
+        r.raise_for_status()
+        rows = r.json() or []
+        resume = None
+        # JSON layout: [header, row, row, ..., [], [resumeKey]]
+        for i, row in enumerate(rows[1:], start=1):
+            if not row:
+                nxt = rows[i + 1] if i + 1 < len(rows) else None
+                resume = nxt[0] if nxt else None
+                break
+            if len(row) >= 4:
+                yield row[0], row[1], row[2], row[3]
+        if not resume:
+            return
+
+
+def _better(a: Capture, b: Optional[Capture]) -> bool:
+    # Same preference as get_archived_id_url: latest 200, else latest anything.
+    if b is None:
+        return True
+    a_ok, b_ok = a[2] == "200", b[2] == "200"
+    if a_ok != b_ok:
+        return a_ok
+    return a[1] > b[1]
+
+
+# Namespace-wide snapshot index: a handful of paged CDX calls per namespace,
+# then every title resolves locally.
+class BulkResolver:
+    def __init__(self, session: requests.Session):
+        self.session = session
+        self.best: Dict[str, Capture] = {}
+        self.by_namespace: Dict[str, List[str]] = {}
+        # (namespace, loose) -> folded title -> url key (None = ambiguous)
+        self.titles: Dict[Tuple[str, bool], Dict[str, Optional[str]]] = {}
+        self.lock = threading.Lock()
+
+    def load(self, namespace: str) -> int:
+        with self.lock:
+            if namespace in self.by_namespace:
+                return len(self.by_namespace[namespace])
+        best: Dict[str, Capture] = {}
+        order: List[str] = []
+        for cap in list_namespace_captures(self.session, namespace):
+            key = url_key(cap[0])
+            if key not in best:
+                order.append(key)
+            if _better(cap, best.get(key)):
+                best[key] = cap
+        titles = {(namespace, loose): {} for loose in (False, True)}
+        for key in order:
+            title = _title_of(key, namespace)
+            if not title:
+                continue
+            for loose in (False, True):
+                index = titles[(namespace, loose)]
+                folded = fold_title(title, loose)
+                index[folded] = key if index.get(folded, key) == key else None
+        with self.lock:
+            self.best.update(best)
+            self.by_namespace[namespace] = order
+            self.titles.update(titles)
+        return len(order)
+
+    def loaded(self, namespace: str) -> bool:
+        # True once the namespace's listing came back in full; a failed
+        # listing leaves it unloaded
+        with self.lock:
+            return namespace in self.by_namespace
+
+    def lookup(self, original: str) -> Optional[Capture]:
+        return self.best.get(url_key(original))
+
+    def resolve(self, original: str) -> Optional[str]:
+        cap = self.lookup(original)
+        if not cap:
+            return None
+        return f"{CFG['WB_WEB']}/{cap[1]}id_/{cap[0]}"
+
+    def match_title(self, namespaces: Iterable[str], title: str) -> Optional[Capture]:
+        # Find a title in the loaded namespaces without any network probes:
+        # exact fold in each namespace first (in the order given), then the
+        # loose fold. Folds shared by two different pages never match.
+        namespaces = list(namespaces)
+        for loose in (False, True):
+            folded = fold_title(title, loose)
+            for ns in namespaces:
+                key = self.titles.get((ns, loose), {}).get(folded)
+                if key:
+                    return self.best[key]
+        return None
+
+    def resolve_title(self, namespaces: Iterable[str], title: str) -> Optional[str]:
+        cap = self.match_title(namespaces, title)
+        if not cap:
+            return None
+        return f"{CFG['WB_WEB']}/{cap[1]}id_/{cap[0]}"
+
+    def originals(self, namespace: str, only_200: bool = True) -> List[str]:
+        out = []
+        for key in self.by_namespace.get(namespace, []):
+            cap = self.best[key]
+            if only_200 and cap[2] != "200":
+                continue
+            out.append(cap[0])
+        return out
+
+
+__all__ = [
+    "BulkResolver",
+    "fold_title",
+    "list_namespace_captures",
+    "url_key",
+]
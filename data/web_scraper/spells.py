@@ -5,9 +5,10 @@ import re
 import uuid, html, unicodedata
 
 from bs4 import BeautifulSoup
+from cache import ResponseCache, default_cache, fetch_cached
 from config import CFG
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from metrics import METRICS
+from transport import shared_session, timeout_tuple
 
 
 _SPELL_NS = uuid.uuid5(uuid.NAMESPACE_URL, "wizard101.spell")
@@ -22,8 +23,16 @@ def _canon(s: str) -> str:
 
 
 class SpellScraper:
-    def __init__(self, session: Optional[requests.Session] = None):
-        self.session = session or _make_session()
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        parse_only: bool = False,
+    ):
+        # parse_only: just the extract_* methods (parse workers), no session
+        # and no page cache
+        self.session = None if parse_only else (session or shared_session())
+        self.cache = None if parse_only else (cache if cache is not None else default_cache())
 
     # --- Discovery ---
     def list_spell_original_urls(self, limit: int = 5000) -> List[str]:
@@ -35,7 +44,7 @@ class SpellScraper:
             "filter": "statuscode:200",
             "limit": str(limit),
         }
-        r = self.session.get(CFG["CDX"], params=params, timeout=_timeout_tuple())
+        r = self.session.get(CFG["CDX"], params=params, timeout=timeout_tuple())
         r.raise_for_status()
         rows = r.json()
         if not rows or len(rows) <= 1:
@@ -43,12 +52,20 @@ class SpellScraper:
         return [row[0] for row in rows[1:] if row]
 
     def build_spell_obj(self, id_url: str) -> dict:
-        timeout = _timeout_tuple(default_read=180)
+        return self.extract_spell_obj(self.fetch_page(id_url), id_url)
+
+    def fetch_page(self, id_url: str) -> bytes:
+        timeout = timeout_tuple(default_read=180)
         headers = {"User-Agent": "Mozilla/5.0 (compatible; SpellScraper/1.0)"}
-        resp = self.session.get(id_url, headers=headers, timeout=timeout, allow_redirects=True)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.content, "lxml")
+        return fetch_cached(self.session, id_url, self.cache, headers=headers, timeout=timeout, allow_redirects=True)
+
+    def extract_spell_obj(self, content: bytes, id_url: str) -> dict:
+        with METRICS.timer("parse"):
+            soup = BeautifulSoup(content, "lxml")
+        with METRICS.timer("extract"):
+            return self._spell_from_soup(soup, id_url)
 
+    def _spell_from_soup(self, soup: BeautifulSoup, id_url: str) -> dict:
         ts, orig_base = self._extract_snapshot_context(id_url)
         spell = {}
 
@@ -104,34 +121,3 @@ class SpellScraper:
 __all__ = [
     "SpellScraper",
 ]
-
-
-def _make_session(total_retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
-    s = requests.Session()
-    retry = Retry(
-        total=total_retries,
-        connect=total_retries,
-        read=total_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET", "HEAD"),
-        raise_on_status=False,
-    )
-    s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; SpellScraper/1.0)"})
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    return s
-
-
-def _timeout_tuple(default_read: int = 120) -> Tuple[int, int]:
-    t = CFG.get("TIMEOUT", default_read)
-    connect = 10
-    read = default_read
-    if isinstance(t, (list, tuple)) and len(t) == 2:
-        try:
-            connect, read = int(t[0]), int(t[1])
-        except Exception:
-            connect, read = 10, default_read
-    elif isinstance(t, (int, float)):
-        read = int(t)
-    return (connect, read)
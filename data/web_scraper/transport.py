@@ -0,0 +1,155 @@
+import threading
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import CFG
+from crawl import AIMDController, HostRateLimiter, RateLimitedSession, parse_retry_after
+from metrics import METRICS
+
+
+# Single HTTP transport for the resolver and all three scrapers: one session,
+# one connection pool per host sized for the crawl concurrency, keep-alive
+# shared across every caller, and one token bucket per host.
+
+USER_AGENT = "Mozilla/5.0 (compatible; PetScraper/1.0)"
+
+LIMITER = HostRateLimiter(CFG["RATE_PER_HOST"], CFG["RATE_BURST"])
+
+# Adaptive in-flight limit for the crawl loops (None when ADAPTIVE is off);
+# starts at CONCURRENCY and moves between MIN_/MAX_CONCURRENCY.
+CONTROLLER: Optional[AIMDController] = None
+if CFG.get("ADAPTIVE"):
+    CONTROLLER = AIMDController(
+        CFG["CONCURRENCY"],
+        minimum=CFG.get("MIN_CONCURRENCY", 1),
+        maximum=CFG.get("MAX_CONCURRENCY", 16),
+        decrease=CFG.get("AIMD_DECREASE", 0.5),
+        latency_target=CFG.get("LATENCY_TARGET", 5.0),
+    )
+
+
+def endpoint(url: str) -> str:
+    # Metrics bucket for a request URL
+    if url.startswith(CFG["CDX"]):
+        return "cdx"
+    if url.startswith(CFG["WB_AVAIL"]):
+        return "available"
+    if "im_/" in url:
+        return "image"
+    if url.startswith(CFG["WB_WEB"]) or "/web/" in url:
+        return "snapshot"
+    return "other"
+
+
+def _record_response(resp, *args, **kwargs):
+    # requests response hook: final status per endpoint plus advertised bytes
+    METRICS.incr(f"http.{endpoint(resp.url)}.{resp.status_code}")
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        METRICS.incr("http.bytes", int(length))
+
+
+def _observe(status, latency, retry_after=None):
+    if status is None:
+        METRICS.incr("http.failed.no_response")
+    if CONTROLLER is not None:
+        CONTROLLER.record(status, latency, retry_after)
+
+
+class _ObservedRetry(Retry):
+    # urllib3 retries 429/5xx and timeouts before requests ever sees them;
+    # report every failed attempt so the controller reacts to the first one.
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        status = response.status if response is not None else None
+        METRICS.incr(f"http.retries.{status if status is not None else type(error).__name__}")
+        if CONTROLLER is not None:
+            retry_after = None
+            if response is not None and status in (429, 503):
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            CONTROLLER.record(status, 0.0, retry_after)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def pool_size() -> int:
+    # connections kept alive per host; must cover every concurrent worker
+    size = CFG.get("POOL_SIZE_PER_HOST")
+    if size:
+        return int(size)
+    workers = CONTROLLER.maximum if CONTROLLER is not None else int(CFG["CONCURRENCY"])
+    return max(10, workers)
+
+
+def make_session(
+    total_retries: int = 3,
+    backoff_factor: float = 0.8,
+    user_agent: str = USER_AGENT,
+    limiter: Optional[HostRateLimiter] = LIMITER,
+) -> requests.Session:
+    s = RateLimitedSession(limiter, _observe)
+    retry = _ObservedRetry(
+        total=total_retries,
+        connect=total_retries,
+        read=total_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+    s.headers.update({"User-Agent": user_agent})
+    s.hooks["response"].append(_record_response)
+    size = pool_size()
+    # pool_connections = number of per-host pools kept; archive.org,
+    # web.archive.org and the wiki are all we ever talk to
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=8, pool_maxsize=size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+_SHARED: Optional[requests.Session] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = make_session()
+        return _SHARED
+
+
+def timeout_tuple(default_read: int = 120) -> Tuple[int, int]:
+    # Accept CFG["TIMEOUT"] as seconds or (connect, read) tuple
+    t = CFG.get("TIMEOUT", default_read)
+    connect = 10
+    read = default_read
+    if isinstance(t, (list, tuple)) and len(t) == 2:
+        try:
+            connect, read = int(t[0]), int(t[1])
+        except Exception:
+            connect, read = 10, default_read
+    elif isinstance(t, (int, float)):
+        read = int(t)
+    return (connect, read)
+
+
+def read_body(resp: requests.Response, chunk_size: int = 64 * 1024) -> bytes:
+    # Pull a stream=True body in chunks so the connection goes straight back
+    # to the pool once the last chunk is read.
+    return b"".join(resp.iter_content(chunk_size))
+
+
+__all__ = [
+    "CONTROLLER",
+    "LIMITER",
+    "USER_AGENT",
+    "endpoint",
+    "make_session",
+    "pool_size",
+    "read_body",
+    "shared_session",
+    "timeout_tuple",
+]
@@ -0,0 +1,398 @@
+import argparse
+import json
+import os
+import queue as q
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import CFG
+from crawl import crawl
+from jsonstream import JsonArrayWriter
+from pipeline import parse_workers, pipeline
+from transport import CONTROLLER
+
+
+# Lease-based work queue in a SQLite file, so several worker processes (on
+# one machine, or on hosts sharing a local-style filesystem that honours
+# SQLite locking) can crawl the same namespaces cooperatively:
+#
+#   python workqueue.py init  --db crawl.db            # seed the Pet: URLs
+#   python workqueue.py work  --db crawl.db            # run on as many hosts as you like
+#   python workqueue.py status --db crawl.db
+#   python workqueue.py export --db crawl.db -o ./data # pets/spells/abilities.json
+#
+# Workers claim batches of QUEUE_BATCH keys under a lease of QUEUE_LEASE
+# seconds and renew it from a heartbeat thread while they work. A lease that
+# runs out (worker killed, host gone) counts as a failed attempt and the item
+# is handed to the next claimer. Pets
+# feed their card and ability titles into the spell and ability queues as
+# they complete, as in main.py's "all" crawl. Results are stored in the
+# database; export writes them in the order the sequential scrape would.
+#
+#   items(kind, key, seq, state, owner, lease_until, attempts, record, error)
+#   state: pending -> leased -> done | failed (after QUEUE_MAX_ATTEMPTS errors
+#          or expired leases)
+
+KINDS = ("pet", "spell", "ability")
+
+_END = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    record TEXT,
+    error TEXT,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS items_claim ON items (kind, state, seq);
+CREATE INDEX IF NOT EXISTS items_owner ON items (owner, state);
+"""
+
+
+class WorkQueue:
+    def __init__(self, path: str, lease: Optional[float] = None, max_attempts: Optional[int] = None):
+        self.path = path
+        self.lease = float(lease or CFG.get("QUEUE_LEASE", 120.0))
+        self.max_attempts = int(max_attempts or CFG.get("QUEUE_MAX_ATTEMPTS", 3))
+        # one connection per thread (heartbeat vs. crawl loop)
+        self.local = threading.local()
+        self._db().executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def _tx(self):
+        return _Transaction(self._db())
+
+    def add(self, kind: str, keys: List[str]) -> int:
+        # Queue keys not seen before (in this order); returns how many were new.
+        if not keys:
+            return 0
+        with self._tx() as db:
+            seq = db.execute("SELECT COALESCE(MAX(seq), -1) FROM items WHERE kind = ?", (kind,)).fetchone()[0]
+            before = db.total_changes
+            for key in keys:
+                seq += 1
+                db.execute("INSERT OR IGNORE INTO items (kind, key, seq) VALUES (?, ?, ?)", (kind, key, seq))
+            return db.total_changes - before
+
+    def claim(self, kind: str, owner: str, n: int) -> List[str]:
+        now = time.time()
+        with self._tx() as db:
+            # a lease that ran out counts as a failed attempt, so an item that
+            # keeps killing or hanging its workers is eventually given up
+            dead = db.execute(
+                "UPDATE items SET state = 'failed', owner = NULL, attempts = attempts + 1, error = 'lease expired' "
+                "WHERE kind = ? AND state = 'leased' AND lease_until < ? AND attempts + 1 >= ?",
+                (kind, now, self.max_attempts),
+            ).rowcount
+            expired = db.execute(
+                "UPDATE items SET state = 'pending', owner = NULL, attempts = attempts + 1, error = 'lease expired' "
+                "WHERE kind = ? AND state = 'leased' AND lease_until < ?",
+                (kind, now),
+            ).rowcount
+            if expired:
+                print(f"Re-queued {expired} {kind} items from expired leases")
+            if dead:
+                print(f"Gave up on {dead} {kind} items after {self.max_attempts} expired or failed attempts")
+            keys = [
+                row[0]
+                for row in db.execute(
+                    "SELECT key FROM items WHERE kind = ? AND state = 'pending' ORDER BY seq LIMIT ?", (kind, n)
+                )
+            ]
+            db.executemany(
+                "UPDATE items SET state = 'leased', owner = ?, lease_until = ? WHERE kind = ? AND key = ?",
+                [(owner, now + self.lease, kind, k) for k in keys],
+            )
+        return keys
+
+    def heartbeat(self, owner: str) -> int:
+        with self._tx() as db:
+            return db.execute(
+                "UPDATE items SET lease_until = ? WHERE owner = ? AND state = 'leased'", (time.time() + self.lease, owner)
+            ).rowcount
+
+    def complete(self, kind: str, key: str, owner: str, record: Optional[dict]) -> bool:
+        # False if the item was already finished by someone else (our lease
+        # ran out and the retry won the race); the first result stands.
+        body = None if record is None else json.dumps(record, ensure_ascii=False)
+        with self._tx() as db:
+            return db.execute(
+                "UPDATE items SET state = 'done', owner = ?, record = ?, error = NULL WHERE kind = ? AND key = ? AND state != 'done'",
+                (owner, body, kind, key),
+            ).rowcount > 0
+
+    def fail(self, kind: str, key: str, owner: str, error: str) -> None:
+        with self._tx() as db:
+            db.execute(
+                "UPDATE items SET attempts = attempts + 1, error = ?, owner = NULL, "
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE kind = ? AND key = ? AND state = 'leased' AND owner = ?",
+                (error, self.max_attempts, kind, key, owner),
+            )
+
+    def release(self, owner: str) -> None:
+        # Hand back whatever this worker still holds (clean shutdown)
+        with self._tx() as db:
+            db.execute("UPDATE items SET state = 'pending', owner = NULL WHERE owner = ? AND state = 'leased'", (owner,))
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        out = {kind: {} for kind in KINDS}
+        for kind, state, n in self._db().execute("SELECT kind, state, COUNT(*) FROM items GROUP BY kind, state"):
+            out.setdefault(kind, {})[state] = n
+        return out
+
+    def unfinished(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM items WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def results(self, kind: str) -> Iterator[Tuple[str, Optional[dict]]]:
+        # (key, record) for every finished item, in queue order
+        rows = self._db().execute("SELECT key, record FROM items WHERE kind = ? AND state = 'done' ORDER BY seq", (kind,))
+        for key, body in rows:
+            yield key, None if body is None else json.loads(body)
+
+    def record(self, kind: str, key: str) -> Optional[dict]:
+        row = self._db().execute("SELECT record FROM items WHERE kind = ? AND key = ? AND state = 'done'", (kind, key)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE ... COMMIT, so claims from concurrent workers serialize
+    # on the database write lock instead of handing out the same rows twice.
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _heartbeat(queue: WorkQueue, owner: str, stop: threading.Event) -> None:
+    while not stop.wait(queue.lease / 3):
+        queue.heartbeat(owner)
+
+
+def seed(queue: WorkQueue) -> int:
+    import main
+    from pets import PetScraper
+
+    main.load_namespaces("Pet")
+    urls = main._bulk().originals("Pet") or PetScraper().list_pet_original_urls()
+    return queue.add("pet", urls)
+
+
+def _claim_batch(queue: WorkQueue, owner: str, batch: int) -> List[Tuple[str, str]]:
+    # Next batch of (kind, key); pets first so spell and ability titles are
+    # discovered as early as possible
+    for kind in KINDS:
+        keys = queue.claim(kind, owner, batch)
+        if keys:
+            return [(kind, key) for key in keys]
+    return []
+
+
+def work(queue: WorkQueue, owner: str, batch: Optional[int] = None, concurrency: Optional[int] = None, poll: float = 5.0) -> Dict[str, int]:
+    # Claim and crawl batches until every queue is drained. With a parse
+    # process pool, one pipeline runs for the worker's whole life: a claimer
+    # thread keeps it fed, claiming the next batch while fewer than `batch`
+    # claimed items are still unfinished. Without one, each batch is crawled
+    # in turn.
+    import main
+    from abilities import AbilityScraper
+    from pets import PetScraper
+    from spells import SpellScraper
+
+    batch = int(batch or CFG.get("QUEUE_BATCH", 8))
+    workers = main._workers(concurrency)
+    main.load_namespaces("Pet", "ItemCard", "Spell", "PetAbility")
+    pet_scraper = PetScraper()
+    spell_scraper = SpellScraper()
+    ability_scraper = AbilityScraper()
+    fetchers = {
+        "pet": lambda u: main._fetch_pet(pet_scraper, u),
+        "spell": lambda s: main._fetch_spell(spell_scraper, s),
+        "ability": lambda a: main._fetch_ability(ability_scraper, a),
+    }
+    extractors = {
+        "pet": pet_scraper.extract_pet_obj,
+        "spell": spell_scraper.extract_spell_obj,
+        "ability": ability_scraper.extract_ability_obj,
+    }
+
+    def fetch_job(item):
+        kind, key = item
+        return fetchers[kind](key)
+
+    def extract(content, id_url, kind):
+        return extractors[kind](content, id_url)
+
+    done = {kind: 0 for kind in KINDS}
+
+    def record(item, result, err) -> None:
+        kind, key = item
+        if err is not None:
+            main._failed(err)
+            print(f"Error scraping {kind} {key}: {err}")
+            queue.fail(kind, key, owner, f"{type(err).__name__}: {err}")
+            return
+        if queue.complete(kind, key, owner, result):
+            done[kind] += 1
+        if kind == "pet" and result is not None:
+            queue.add("spell", main._spell_titles(result))
+            queue.add("ability", main._ability_titles(result))
+
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, owner, stop), daemon=True)
+    beat.start()
+    try:
+        if main._PROFILER is None and parse_workers() > 0:
+            _work_pipelined(queue, owner, batch, workers, poll, fetch_job, record, stop)
+        else:
+            while True:
+                items = _claim_batch(queue, owner, batch)
+                if items:
+                    job = lambda item: _crawl_job(item, fetch_job, extract)
+                    for item, result, err in crawl(items, job, workers, controller=CONTROLLER):
+                        record(item, result, err)
+                    continue
+                if not queue.unfinished():
+                    break
+                # others still hold leases; wait for their results or expiry
+                time.sleep(poll)
+        return done
+    finally:
+        stop.set()
+        queue.release(owner)
+        main.flush_resolution_cache()
+
+
+def _crawl_job(item, fetch_job, extract):
+    id_url, content, record = fetch_job(item)
+    return extract(content, id_url, item[0]) if content is not None else record
+
+
+def _work_pipelined(queue: WorkQueue, owner: str, batch: int, workers: int, poll: float, fetch_job, record, stop) -> None:
+    feed: q.Queue = q.Queue()
+    cond = threading.Condition()
+    outstanding = [0]
+    errors: list = []
+
+    def claimer():
+        try:
+            while not stop.is_set():
+                with cond:
+                    while outstanding[0] >= batch and not stop.is_set():
+                        cond.wait()
+                items = _claim_batch(queue, owner, batch)
+                if items:
+                    with cond:
+                        outstanding[0] += len(items)
+                    for item in items:
+                        feed.put(item)
+                    continue
+                with cond:
+                    mine = outstanding[0]
+                if not mine and not queue.unfinished():
+                    return
+                # our own items may still add spells/abilities; others may
+                # still hold leases: look again shortly
+                with cond:
+                    cond.wait(timeout=poll if not mine else None)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            feed.put(_END)
+
+    t = threading.Thread(target=claimer, daemon=True)
+    t.start()
+    try:
+        stages = pipeline(iter(feed.get, _END), fetch_job, lambda item: item[0], fetchers=workers, controller=CONTROLLER)
+        for item, result, err in stages:
+            record(item, result, err)
+            with cond:
+                outstanding[0] -= 1
+                cond.notify_all()
+    finally:
+        stop.set()
+        with cond:
+            cond.notify_all()
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def export(queue: WorkQueue, out_dir: str) -> Dict[str, int]:
+    # Write pets.json / spells.json / abilities.json from the finished items,
+    # in the order of a sequential scrape: pets in listing order, spells and
+    # abilities in first-seen order over the exported pets.
+    import main
+
+    pets_path = os.path.join(out_dir, "pets.json")
+    with JsonArrayWriter(pets_path) as out:
+        for _, record in queue.results("pet"):
+            if record is not None:
+                out.write(record)
+    written = {"pet": out.count}
+
+    spell_order, ability_order = main.collect_titles_from_pets(pets_path)
+    for kind, name, order in (("spell", "spells.json", spell_order), ("ability", "abilities.json", ability_order)):
+        with JsonArrayWriter(os.path.join(out_dir, name)) as out:
+            for key in order:
+                record = queue.record(kind, key)
+                if record is not None:
+                    out.write(record)
+        written[kind] = out.count
+    return written
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Lease-based SQLite work queue for cooperative crawls")
+    ap.add_argument("command", choices=["init", "work", "status", "export"])
+    ap.add_argument("--db", default="./data/crawl.db")
+    ap.add_argument("--worker-id", default=None, help="lease owner name (default: host-pid-random)")
+    ap.add_argument("--batch", type=int, default=None, help="keys claimed per lease (default QUEUE_BATCH)")
+    ap.add_argument("--concurrency", type=int, default=None, help="requests in flight per worker (ceiling in adaptive mode)")
+    ap.add_argument("-o", "--output-dir", default="./data", help="export: where the JSON files go")
+    args = ap.parse_args(argv)
+
+    queue = WorkQueue(args.db)
+    if args.command == "init":
+        print(f"Queued {seed(queue)} new pet URLs in {args.db}")
+    elif args.command == "work":
+        owner = args.worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        start = time.perf_counter()
+        done = work(queue, owner, args.batch, args.concurrency)
+        elapsed = time.perf_counter() - start
+        total = sum(done.values())
+        print(f"Worker {owner}: finished {done} in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.2f} items/s)")
+    elif args.command == "export":
+        written = export(queue, args.output_dir)
+        print(f"Exported {written['pet']} pets, {written['spell']} spells, {written['ability']} abilities to {args.output_dir}")
+    for kind, states in queue.counts().items():
+        print(f"  {kind:<8} " + ", ".join(f"{s}={n}" for s, n in sorted(states.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())